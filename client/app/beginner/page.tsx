@@ -65,6 +65,7 @@ const Beginner = () => {
   const [userData, setUserData] = useState<FetchedData | null>(null);
   const [isLoading, setIsLoading] = useState<boolean>(false);
   const [skills, setSkills] = useState<Record<string, string[]>>({});
+  const [chatSessionId, setChatSessionId] = useState<string | null>(null);
 
 
   // Helper function to extract and organize skills
@@ -243,19 +244,29 @@ const Beginner = () => {
       }
     };
 
+    const postQuery = (body: object) => fetch('/api/chatone_followup', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(body)
+    });
+
     try {
-      // Get AI response for follow-up message
-      const aiResponse = await fetch('/api/chatone_followup', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify(context)
-      });
+      // Get AI response for follow-up message. Once the server holds the
+      // session, only the new query needs to be sent
+      let aiResponse = await postQuery(
+        chatSessionId ? { sessionId: chatSessionId, currentQuery: userMessage } : context
+      );
+      if (aiResponse.status === 404 && chatSessionId) {
+        // Session expired on the server: start a new one from the full context
+        aiResponse = await postQuery(context);
+      }
 
       if (!aiResponse.ok) throw new Error('Failed to get AI response');
       
       const response = await aiResponse.json();
+      setChatSessionId(response.sessionId);
       
       // Add AI response to chat
       const newBotMessage: ChatMessage = {
@@ -9,9 +9,13 @@ interface ChatMessage {
   content: any;
 }
 
+// Either the content itself or a reference the server resolves from the
+// files it already downloaded
 interface FileContent {
   name: string;
-  content: string;
+  content?: string;
+  download_url?: string;
+  content_hash?: string;
 }
 
 const RepositoryAnalyzer = () => {
@@ -22,6 +26,7 @@ const RepositoryAnalyzer = () => {
   const [userMessage, setUserMessage] = useState('');
   const [fileContents, setFileContents] = useState<FileContent[]>([]);
   const [analysisContext, setAnalysisContext] = useState<any>(null);
+  const [chatSessionId, setChatSessionId] = useState<string | null>(null);
 
 
   const fetchFileContent = async (owner: string, repo: string, path: string) => {
@@ -139,10 +144,16 @@ ${analysis.recommendations.additional_context}
 
         const aiResult = await aiResponse.json();
         setAnalysisContext(aiResult.reply);
+        setChatSessionId(null);
         
         // Fetch contents of relevant files
         const relevantFiles = aiResult.reply.file_analysis.analyzed_files;
+        const fileRefs: any[] = aiResult.files || [];
         const fileContentsPromises = relevantFiles.map(async (file: any) => {
+          const ref = fileRefs.find((r: any) => r.file_name === file.file_name);
+          if (ref) {
+            return { name: file.file_name, download_url: ref.download_url, content_hash: ref.content_hash };
+          }
           try {
             const content = await fetchFileContent(owner, repo, file.file_name);
             return { name: file.file_name, content };
@@ -204,7 +215,7 @@ ${analysis.recommendations.additional_context}
       const context = {
         previousMessages: messages,
         currentQuery: userMessage,
-        fileContents: isCodeExplanation ? fileContents : undefined,
+        fileContents,
         analysisContext,
         requestType: isCodeExplanation ? 'code_explanation' : 
                     isWorkflowRequest ? 'workflow' : 'general',
@@ -214,15 +225,27 @@ ${analysis.recommendations.additional_context}
         }
       };
 
-      const aiResponse = await fetch('/api/chattwo_followup', {
+      const postQuery = (body: object) => fetch('/api/chattwo_followup', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(context)
+        body: JSON.stringify(body)
       });
 
+      // The server keeps history, files and analysis per session; after the
+      // first turn only the new query is sent
+      let aiResponse = await postQuery(chatSessionId ? {
+        sessionId: chatSessionId,
+        currentQuery: userMessage,
+        requestType: context.requestType
+      } : context);
+      if (aiResponse.status === 404 && chatSessionId) {
+        aiResponse = await postQuery(context);
+      }
+
       if (!aiResponse.ok) throw new Error('Failed to get AI response');
       
       const response = await aiResponse.json();
+      setChatSessionId(response.sessionId);
       
       // Add appropriate emoji based on response type
       const emoji = isCodeExplanation ? '💻' : 
@@ -34,7 +34,7 @@ const fetchDetails = async (repoUrl: string) => {
       }
       
       const items = await response.json();
-      let files: { name: string; path: string; download_url: string }[] = [];
+      let files: { name: string; path: string; download_url: string; sha: string }[] = [];
 
       for (const item of items) {
         if (item.type === 'file' && (/\.(js|py|java|cpp|html|json|xml|rb|go|php|ts|tsx|jsx|sh|yml|yaml)$/i).test(item.name)) {
@@ -42,6 +42,7 @@ const fetchDetails = async (repoUrl: string) => {
             name: item.name,
             path: item.path,
             download_url: item.download_url,
+            sha: item.sha,  // git blob SHA; the server skips re-downloading files it has embedded
           });
         } else if (item.type === 'dir') {
           try {
@@ -100,7 +101,8 @@ const fetchDetails = async (repoUrl: string) => {
           filteredFiles: filteredFiles.map(file => ({
             name: file.name,
             path: file.path,
-            download_url: file.download_url
+            download_url: file.download_url,
+            sha: file.sha
           })),
           issueDetails: issueDetails ? {
             owner: issueDetails.owner,
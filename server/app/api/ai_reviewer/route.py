@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, Response
 from pydantic import BaseModel
+from typing import Optional
 import os
+import json
+import asyncio
 import httpx
 import logging
+from model.content_store import content_store
+from model.deadline import ClientDisconnected, Deadline, cancel_on_disconnect
+from model.embedding_store import blob_sha
 
 router = APIRouter()
 
@@ -16,6 +22,7 @@ class FileMatch(BaseModel):
     file_name: str
     download_url: str
     match_score: float
+    content_hash: Optional[str] = None  # set by /analyse-issue for content it already downloaded
 
 class ReviewPayload(BaseModel):
     content_matches: list[FileMatch]
@@ -26,29 +33,88 @@ class ReviewPayload(BaseModel):
     issue_title: str
     issue_body: str
 
-async def fetch_file_content(url: str) -> str:
+def truncate(text: str) -> str:
+    return text[:MAX_CHARS_PER_FILE] + '\n... (truncated)' if len(text) > MAX_CHARS_PER_FILE else text
+
+async def fetch_file_content(url: str, content_hash: Optional[str] = None, deadline: Optional[Deadline] = None) -> tuple[str, Optional[str]]:
+    """
+    Full file content and its hash, read from the shared content store when
+    /analyse-issue (or an earlier review) already downloaded it.
+    """
+    text = content_store.get(content_hash, url)
+    if text is not None:
+        # The URL fallback may return newer content than content_hash names
+        return text, blob_sha(text)
+    if deadline and deadline.expired():
+        return "Error fetching file.", None
     try:
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(timeout=deadline.remaining() if deadline else 5.0) as client:
             res = await client.get(url)
             res.raise_for_status()
-            text = res.text[:MAX_CHARS_PER_FILE]
-            return text + '\n... (truncated)' if len(res.text) > MAX_CHARS_PER_FILE else text
+            return res.text, content_store.put(url, res.text)
     except Exception as e:
         logging.error(f"Failed to fetch file content: {e}")
-        return "Error fetching file."
+        return "Error fetching file.", None
+
+def fallback_review(payload: ReviewPayload, file_infos: list[dict]) -> str:
+    """
+    Reply in the same JSON shape as the AI review, built from the match
+    scores alone, for when the deadline leaves no time for the LLM.
+    """
+    return json.dumps({
+        "repository_analysis": {
+            "purpose": f"{payload.owner}/{payload.repo}",
+            "tech_stack": [],
+            "issue_summary": payload.issue_title
+        },
+        "file_analysis": {
+            "analyzed_files": [
+                {"file_name": f["file_name"], "combined_probability": f["match_score"],
+                 "reason": "Ranked by similarity to the issue; the AI review timed out"}
+                for f in file_infos
+            ]
+        },
+        "recommendations": {
+            "priority_order": [f["file_name"] for f in file_infos],
+            "specific_changes": "",
+            "additional_context": "The AI review did not finish in time; try again for a detailed analysis."
+        }
+    })
 
 @router.post("/ai-review")
-async def review_issue(payload: ReviewPayload):
+async def review_issue(payload: ReviewPayload, request: Request):
     if not COHERE_API_KEY:
         raise HTTPException(status_code=500, detail="Cohere API key is not configured")
 
+    deadline = Deadline.from_headers(request.headers)
+    try:
+        return await cancel_on_disconnect(request, run_review(payload, deadline))
+    except ClientDisconnected:
+        return Response(status_code=499)
+
+async def run_review(payload: ReviewPayload, deadline: Deadline):
     combined = payload.content_matches + payload.filename_matches
     top_files = sorted(combined, key=lambda x: x.match_score, reverse=True)[:MAX_FILES]
 
+    fetched = await asyncio.gather(*[
+        fetch_file_content(f.download_url, f.content_hash, deadline) for f in top_files
+    ])
     file_infos = []
-    for f in top_files:
-        content = await fetch_file_content(f.download_url)
-        file_infos.append({"file_name": f.file_name, "match_score": f.match_score, "content": content})
+    for f, (content, content_hash) in zip(top_files, fetched):
+        file_infos.append({
+            "file_name": f.file_name,
+            "match_score": f.match_score,
+            "content": truncate(content),
+            "download_url": f.download_url,
+            "content_hash": content_hash
+        })
+
+    # References the chat route can resolve from the content store,
+    # so the client never has to upload these files again
+    files = [
+        {"file_name": f["file_name"], "download_url": f["download_url"], "content_hash": f["content_hash"]}
+        for f in file_infos if f["content_hash"]
+    ]
 
     prompt = f"""
 Analyze this GitHub issue and relevant files:
@@ -89,14 +155,20 @@ Provide analysis in JSON format:
 }
 """
 
+    if deadline.expired():
+        return {"reply": fallback_review(payload, file_infos), "files": files, "fallback": True}
+
     try:
         headers = {"Authorization": f"Bearer {COHERE_API_KEY}", "Content-Type": "application/json"}
         body = {"message": prompt, "model": "command-r-plus"}
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(timeout=deadline.remaining()) as client:
             response = await client.post(COHERE_API_URL, headers=headers, json=body)
             response.raise_for_status()
             content = response.json().get("text", "{}").strip()
-            return {"reply": content}
+            return {"reply": content, "files": files}
+    except httpx.TimeoutException:
+        logging.warning("AI analysis hit the request deadline; returning fallback review")
+        return {"reply": fallback_review(payload, file_infos), "files": files, "fallback": True}
     except Exception as e:
         logging.error(f"AI analysis failed: {e}")
         raise HTTPException(status_code=500, detail="AI analysis request failed")
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, Response
 from fastapi.responses import JSONResponse
 import os
+import asyncio
 import cohere
 from dotenv import load_dotenv
 import json
 import logging
+from model.deadline import ClientDisconnected, Deadline, call_with_deadline, cancel_on_disconnect
 
 load_dotenv()
 
@@ -20,6 +22,7 @@ co = cohere.Client(COHERE_API_KEY)
 @router.post("/api/ai_suggest")
 async def suggest_issues(request: Request):
     try:
+        deadline = Deadline.from_headers(request.headers)
         body = await request.json()
 
         user_languages = list({repo.get("language") for repo in body["repositories"] if repo.get("language")})
@@ -84,12 +87,18 @@ FORMAT YOUR RESPONSE AS JSON following the structure below:
 }}
 """
 
-        response = co.generate(
-            model="command-r",
-            prompt=prompt,
-            max_tokens=1000,
-            temperature=0.7
-        )
+        # Give up at the deadline or when the client leaves
+        try:
+            response = await cancel_on_disconnect(request, call_with_deadline(
+                deadline, co.generate,
+                model="command-r",
+                prompt=prompt,
+                max_tokens=1000,
+                temperature=0.7
+            ))
+        except asyncio.TimeoutError:
+            logging.warning("AI Suggestion hit the request deadline; returning no recommendations")
+            return JSONResponse(status_code=200, content={"reply": {"recommendations": []}, "fallback": True})
 
         raw_text = response.generations[0].text.strip()
         cleaned_json = raw_text.replace("```json", "").replace("```", "").strip()
@@ -99,6 +108,8 @@ FORMAT YOUR RESPONSE AS JSON following the structure below:
 
         return JSONResponse(status_code=200, content={"reply": {"recommendations": recommendations}})
 
+    except ClientDisconnected:
+        return Response(status_code=499)
     except Exception as e:
         logging.exception("AI Suggestion failed")
         raise HTTPException(status_code=500, detail=str(e))
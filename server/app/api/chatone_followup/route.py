@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request, HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
 import os
 import re
+import json
+import asyncio
 import cohere
 from dotenv import load_dotenv
 import logging
+from model.cache import Cache
+from model.config import CONFIG
+from model.deadline import ClientDisconnected, Deadline, call_with_deadline, cancel_on_disconnect
+from model.session_store import session_store
 
 load_dotenv()
 
@@ -37,28 +44,88 @@ class TechnicalContext(BaseModel):
     languages: list[str]
     topics: list[str]
 
+# With a sessionId only currentQuery is needed; the rest is sent on the
+# first turn (or again after the session expires) and kept server-side
 class ChatContext(BaseModel):
-    userProfile: UserProfile
-    previousMessages: list[ChatMessage]
     currentQuery: str
-    userRepos: list[Repository]
-    technicalContext: TechnicalContext
+    sessionId: Optional[str] = None
+    userProfile: Optional[UserProfile] = None
+    previousMessages: list[ChatMessage] = []
+    userRepos: list[Repository] = []
+    technicalContext: Optional[TechnicalContext] = None
+
+GUIDANCE_PATTERNS = {
+    'setup': re.compile(r"(how to|help|can you|where do I) (start|begin|setup|set up|initialize)", re.I),
+    'files': re.compile(r"(which|what|where) (files?|code|changes|modify)", re.I),
+    'workflow': re.compile(r"(steps|process|workflow|how do I|what should I)", re.I),
+    'testing': re.compile(r"(test|verify|check|validate)", re.I),
+    'submission': re.compile(r"(submit|PR|pull request|contribute)", re.I),
+    'explanation': re.compile(r"(explain|understand|what does|mean|confused|unclear)", re.I),
+    'error': re.compile(r"(error|problem|issue|not working|failed)", re.I),
+    'conceptual': re.compile(r"(concept|theory|principle|how does|why does)", re.I)
+}
+
+# Whole-question patterns for generic how-tos whose answer depends only on
+# the repo, not on the user's code or error
+FAST_PATH_PATTERNS = {
+    'submission': re.compile(r"^(how (do|can|should) i|how to) (open|create|make|submit|raise|send) (a |my )?(pr|pull request)s?$", re.I),
+    'testing': re.compile(r"^(how (do|can|should) i|how to) (run|execute) (the )?(tests?|test suite|unit tests)$", re.I),
+    'setup': re.compile(r"^(how (do|can|should) i|how to|where do i) (start|begin|set ?up)( the)?( project| repo| repository| environment)?( locally)?$", re.I),
+}
+
+# Categories that mean the question is about something specific to the user
+SPECIFIC_CATEGORIES = {'files', 'explanation', 'error'}
+
+REPO_URL_PATTERN = re.compile(r"github\.com/([\w.-]+)/([\w.-]+)")
+
+answer_cache = Cache()
+
+FALLBACK_REPLY = (
+    "Sorry, I'm taking longer than usual to put together a good answer. 🙏 "
+    "Please try asking again in a moment."
+)
 
 # Helper to categorize guidance needs
 def analyze_user_query(query: str) -> list[str]:
-    patterns = {
-        'setup': re.compile(r"(how to|help|can you|where do I) (start|begin|setup|set up|initialize)", re.I),
-        'files': re.compile(r"(which|what|where) (files?|code|changes|modify)", re.I),
-        'workflow': re.compile(r"(steps|process|workflow|how do I|what should I)", re.I),
-        'testing': re.compile(r"(test|verify|check|validate)", re.I),
-        'submission': re.compile(r"(submit|PR|pull request|contribute)", re.I),
-        'explanation': re.compile(r"(explain|understand|what does|mean|confused|unclear)", re.I),
-        'error': re.compile(r"(error|problem|issue|not working|failed)", re.I),
-        'conceptual': re.compile(r"(concept|theory|principle|how does|why does)", re.I)
-    }
-    categories = [cat for cat, pat in patterns.items() if pat.search(query)]
+    categories = [cat for cat, pat in GUIDANCE_PATTERNS.items() if pat.search(query)]
     return categories or ['general']
 
+# Helper to decide whether a query is a generic how-to a cached answer can serve
+def classify_fast_path(query: str, categories: list[str]) -> tuple[Optional[str], float]:
+    normalized = query.strip().rstrip('?!. ').strip()
+    for intent, pattern in FAST_PATH_PATTERNS.items():
+        if pattern.match(normalized):
+            return intent, 0.5 if SPECIFIC_CATEGORIES.intersection(categories) else 1.0
+    return None, 0.0
+
+def answer_cache_key(repo: str, intent: str) -> str:
+    return answer_cache.get_cache_key({'fast_path': intent, 'repo': repo})
+
+# The repo a conversation is about, or None unless exactly one is mentioned
+def single_repo(issue_context: str) -> Optional[str]:
+    repos = {f"{owner}/{name.removesuffix('.git').rstrip('.')}".lower()
+             for owner, name in REPO_URL_PATTERN.findall(issue_context)}
+    return repos.pop() if len(repos) == 1 else None
+
+# A prompt for a fast-path intent with nothing user-specific in it, so its
+# answer can be cached and served to anyone asking about the repo
+def generic_prompt(repo: str, query: str) -> str:
+    return f"""
+As an experienced open source mentor, answer a beginner's question about contributing to the GitHub repository {repo}.
+
+QUESTION:
+{query}
+
+Give clear, step-by-step instructions suited to beginners, based on the usual conventions of this repository
+(its README, CONTRIBUTING guide, build and test tooling). Use simple language and a friendly, encouraging tone.
+"""
+
+def stream_answer(text: str, session_id: str):
+    # Server-sent events, one paragraph per event
+    for chunk in re.split(r"(?<=\n\n)", text):
+        yield f"data: {json.dumps({'delta': chunk})}\n\n"
+    yield f"data: {json.dumps({'done': True, 'sessionId': session_id})}\n\n"
+
 # Helper to extract issue context
 def extract_issue_context(messages: list[ChatMessage]) -> str:
     for msg in messages:
@@ -69,25 +136,73 @@ def extract_issue_context(messages: list[ChatMessage]) -> str:
             return msg.content
     return ''
 
+# Helper to resume the caller's session or start one from the full context
+def load_session(context: ChatContext):
+    session = session_store.get(context.sessionId)
+    if session:
+        return context.sessionId, session
+    if context.userProfile is None or context.technicalContext is None:
+        if context.sessionId:
+            raise HTTPException(status_code=404, detail="Chat session expired; resend the full context")
+        raise HTTPException(status_code=400, detail="userProfile and technicalContext are required to start a session")
+
+    session_id = session_store.create(
+        public_repos=context.userProfile.public_repos,
+        technical_context=context.technicalContext.model_dump(),
+    )
+    session = session_store.get(session_id)
+    session['turns'] = [m.model_dump() for m in context.previousMessages][-session_store.max_turns:]
+    return session_id, session
+
+# Helper for the part of the prompt that only changes with the session
+def developer_context(session) -> str:
+    if 'prompt_prefix' not in session['derived']:
+        technical_context = session['technical_context']
+        session['derived']['prompt_prefix'] = f"""
+As an experienced open source mentor helping a beginner developer, provide detailed guidance based on their question.
+
+DEVELOPER CONTEXT:
+- Experience Level: Beginner
+- Known Languages: {', '.join(technical_context['languages'])}
+- Interests/Topics: {', '.join(technical_context['topics'])}
+- Public Repos: {session['public_repos']}
+"""
+    return session['derived']['prompt_prefix']
+
 @router.post("/api/chatone_followup")
 async def chatone_followup(request: Request):
     try:
+        deadline = Deadline.from_headers(request.headers)
         data = await request.json()
         context = ChatContext(**data)
+        session_id, session = load_session(context)
+        messages = [ChatMessage(**t) for t in session['turns']]
 
         guidance_needed = analyze_user_query(context.currentQuery)
-        issue_context = extract_issue_context(context.previousMessages)
-        chat_history = "\n\n".join(f"{m.type.upper()}: {m.content}" for m in context.previousMessages)
+        issue_context = session['derived'].get('issue_context') or extract_issue_context(messages)
+        if issue_context:
+            session['derived']['issue_context'] = issue_context
 
-        prompt = f"""
-As an experienced open source mentor helping a beginner developer, provide detailed guidance based on their question.
-
-DEVELOPER CONTEXT:
-- Experience Level: Beginner
-- Known Languages: {', '.join(context.technicalContext.languages)}
-- Interests/Topics: {', '.join(context.technicalContext.topics)}
-- Public Repos: {context.userProfile.public_repos}
+        # Generic how-tos for a repo we've already answered skip the LLM;
+        # only when the conversation is about one identifiable repo
+        repo = single_repo(issue_context)
+        intent, confidence = classify_fast_path(context.currentQuery, guidance_needed)
+        fast_path = repo is not None and intent is not None and confidence >= CONFIG['FAST_PATH_MIN_CONFIDENCE']
+        cached_answer = answer_cache.get(answer_cache_key(repo, intent)) if fast_path else None
+        if cached_answer:
+            session_store.append_turns(
+                session_id, session,
+                {'type': 'user', 'content': context.currentQuery},
+                {'type': 'bot', 'content': cached_answer},
+            )
+            if 'text/event-stream' in request.headers.get('accept', ''):
+                return StreamingResponse(stream_answer(cached_answer, session_id), media_type="text/event-stream")
+            return JSONResponse(status_code=200, content={"reply": cached_answer, "sessionId": session_id, "source": "fast_path"})
+        chat_history = "\n\n".join(f"{m.type.upper()}: {m.content}" for m in messages)
 
+        # A fast-path miss is answered from the repo alone, leaving out this
+        # user's profile and history, since the answer is cached for everyone
+        prompt = generic_prompt(repo, context.currentQuery) if fast_path else f"""{developer_context(session)}
 GUIDANCE CATEGORIES NEEDED: {', '.join(guidance_needed)}
 
 ISSUE CONTEXT:
@@ -120,16 +235,37 @@ RESPONSE GUIDELINES:
 
 Remember: Keep explanations beginner-friendly and maintain an encouraging tone throughout.
 """
-        # Send to Cohere
-        response = co.generate(
-            model="command-xlarge-beta",
-            prompt=prompt,
-            max_tokens=1000,
-            temperature=0.7
-        )
+        # Keep the session (first-turn history, issue context) usable even if
+        # this turn times out or the client leaves
+        session_store.save(session_id, session)
+
+        # Send to Cohere, giving up at the deadline or when the client leaves
+        try:
+            response = await cancel_on_disconnect(request, call_with_deadline(
+                deadline, co.generate,
+                model="command-xlarge-beta",
+                prompt=prompt,
+                max_tokens=1000,
+                temperature=0.7
+            ))
+        except asyncio.TimeoutError:
+            logging.warning("Chat follow-up hit the request deadline; returning fallback reply")
+            return JSONResponse(status_code=200, content={"reply": FALLBACK_REPLY, "sessionId": session_id, "fallback": True})
         reply_text = response.generations[0].text.strip()
-        return JSONResponse(status_code=200, content={"reply": reply_text})
+        if fast_path:
+            # Warm the fast path for the next person asking this about the repo
+            answer_cache.set(answer_cache_key(repo, intent), reply_text)
+        session_store.append_turns(
+            session_id, session,
+            {'type': 'user', 'content': context.currentQuery},
+            {'type': 'bot', 'content': reply_text},
+        )
+        return JSONResponse(status_code=200, content={"reply": reply_text, "sessionId": session_id})
 
+    except HTTPException:
+        raise
+    except ClientDisconnected:
+        return Response(status_code=499)
     except Exception as e:
         logging.exception("Chat follow-up failed")
         raise HTTPException(status_code=500, detail=str(e))
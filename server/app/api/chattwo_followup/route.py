@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, Response
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+from typing import Optional
 import os
+import asyncio
 import cohere
+import httpx
 from dotenv import load_dotenv
 import logging
+from model.content_store import content_store
+from model.deadline import ClientDisconnected, Deadline, call_with_deadline, cancel_on_disconnect
+from model.session_store import session_store
 
 load_dotenv()
 
@@ -21,9 +27,13 @@ class ChatMessage(BaseModel):
     type: str  # 'bot' or 'user'
     content: str
 
+# Either the raw content or a reference (content_hash and/or download_url)
+# to a file /analyse-issue or the reviewer already stored
 class FileContent(BaseModel):
     name: str
-    content: str
+    content: Optional[str] = None
+    download_url: Optional[str] = None
+    content_hash: Optional[str] = None
 
 class TechnicalContext(BaseModel):
     languages: list[str]
@@ -40,19 +50,87 @@ class AnalysisContext(BaseModel):
     repository_analysis: RepositoryAnalysis
     recommendations: RecommendationsContext
 
+# With a sessionId only currentQuery and requestType are needed; files and
+# analysis context are sent on the first turn (or when they change) and kept
+# server-side
 class ChatTwoPayload(BaseModel):
-    previousMessages: list[ChatMessage]
     currentQuery: str
-    fileContents: list[FileContent]
-    analysisContext: AnalysisContext
     requestType: str  # 'code_explanation', 'workflow', or other
-    technicalContext: TechnicalContext
+    sessionId: Optional[str] = None
+    previousMessages: list[ChatMessage] = []
+    fileContents: Optional[list[FileContent]] = None
+    analysisContext: Optional[AnalysisContext] = None
+    technicalContext: Optional[TechnicalContext] = None
+
+FALLBACK_REPLY = (
+    "Sorry, this is taking longer than expected and I couldn't finish an answer in time. "
+    "Please try asking again in a moment."
+)
 
 # Helper functions
-def generate_code_explanation_prompt(file_contents, query, context):
-    files_text = "\n".join(
-        f"File: {f.name}\nContent:\n{f.content}" for f in file_contents
-    )
+def file_reference(f: FileContent) -> dict:
+    """
+    What the session keeps for a file: a content store reference, or the
+    body itself only when the client sent one with no URL to refetch it from.
+    """
+    ref = {'name': f.name, 'download_url': f.download_url, 'content_hash': f.content_hash}
+    if f.content is not None:
+        if not f.download_url:
+            return {**ref, 'content': f.content}
+        # Stored by hash only: a client must not be able to bind what other
+        # requests get for a URL
+        ref['content_hash'] = content_store.put(None, f.content)
+    return ref
+
+
+async def resolve_file_contents(files: list[dict], deadline: Deadline) -> list[dict]:
+    resolved = []
+    async with httpx.AsyncClient(timeout=deadline.remaining()) as client:
+        for f in files:
+            content = f.get('content')
+            if content is None:
+                content = content_store.get(f['content_hash'], f['download_url'])
+            if content is None and f['download_url'] and not deadline.expired():
+                try:
+                    res = await client.get(f['download_url'])
+                    res.raise_for_status()
+                    content = res.text
+                    content_store.put(f['download_url'], content)
+                except Exception as e:
+                    logging.error(f"Failed to fetch {f['name']}: {e}")
+            resolved.append({'name': f['name'], 'content': content if content is not None else 'Unable to fetch file content'})
+    return resolved
+
+
+def load_session(payload: ChatTwoPayload):
+    session_id = payload.sessionId
+    session = session_store.get(session_id)
+    if not session:
+        if payload.analysisContext is None or payload.technicalContext is None:
+            if session_id:
+                raise HTTPException(status_code=404, detail="Chat session expired; resend the full context")
+            raise HTTPException(status_code=400, detail="analysisContext and technicalContext are required to start a session")
+        session_id = session_store.create(file_contents=[])
+        session = session_store.get(session_id)
+        session['turns'] = [m.model_dump() for m in payload.previousMessages][-session_store.max_turns:]
+
+    # Anything the client resends replaces what the session holds
+    if payload.fileContents is not None:
+        session['file_contents'] = [file_reference(f) for f in payload.fileContents]
+    if payload.analysisContext is not None:
+        session['analysis_context'] = payload.analysisContext.model_dump()
+    if payload.technicalContext is not None:
+        session['technical_context'] = payload.technicalContext.model_dump()
+    return session_id, session
+
+
+async def session_files_text(session, deadline: Deadline) -> str:
+    # Bodies are looked up per turn rather than copied into the session
+    files = await resolve_file_contents(session['file_contents'], deadline)
+    return "\n".join(f"File: {f['name']}\nContent:\n{f['content']}" for f in files)
+
+
+def generate_code_explanation_prompt(files_text, query, context):
     return (
         f"As a developer experienced in {', '.join(context.repository_analysis.tech_stack)}, "
         f"explain the following code in the context of {context.repository_analysis.purpose}.\n\n"
@@ -105,47 +183,69 @@ def generate_general_prompt(query, context, previous_messages):
 @router.post("/api/chattwo_followup")
 async def chattwo_followup(request: Request):
     try:
+        deadline = Deadline.from_headers(request.headers)
         data = await request.json()
         payload = ChatTwoPayload(**data)
+        session_id, session = load_session(payload)
+        analysis_context = AnalysisContext(**session['analysis_context'])
+        previous_messages = [ChatMessage(**t) for t in session['turns']]
 
         # Select prompt based on requestType
         if payload.requestType == 'code_explanation':
             prompt = generate_code_explanation_prompt(
-                payload.fileContents,
+                await session_files_text(session, deadline),
                 payload.currentQuery,
-                payload.analysisContext
+                analysis_context
             )
         elif payload.requestType == 'workflow':
             prompt = generate_workflow_prompt(
                 payload.currentQuery,
-                payload.analysisContext,
-                payload.previousMessages
+                analysis_context,
+                previous_messages
             )
         else:
             prompt = generate_general_prompt(
                 payload.currentQuery,
-                payload.analysisContext,
-                payload.previousMessages
+                analysis_context,
+                previous_messages
             )
 
         # System message
         system_content = (
-            f"You are an expert {', '.join(payload.technicalContext.languages)} developer and technical advisor. " +
+            f"You are an expert {', '.join(session['technical_context']['languages'])} developer and technical advisor. " +
             ("Provide detailed, educational code explanations with examples and best practices."
              if payload.requestType == 'code_explanation'
              else "Offer clear, actionable guidance while maintaining context from previous messages.")
         )
 
-        # Call Cohere
-        response = co.generate(
-            model="command-xlarge-beta",
-            prompt=f"System: {system_content}\nUser: {prompt}",
-            max_tokens=2000,
-            temperature=0.7
-        )
+        # Keep the session usable even if this turn times out or the client
+        # leaves: a sessionId is returned either way
+        session_store.save(session_id, session)
+
+        # Call Cohere, giving up at the deadline or when the client leaves
+        try:
+            response = await cancel_on_disconnect(request, call_with_deadline(
+                deadline, co.generate,
+                model="command-xlarge-beta",
+                prompt=f"System: {system_content}\nUser: {prompt}",
+                max_tokens=2000,
+                temperature=0.7
+            ))
+        except asyncio.TimeoutError:
+            logging.warning("Chat Two follow-up hit the request deadline; returning fallback reply")
+            return JSONResponse(status_code=200, content={"reply": FALLBACK_REPLY, "sessionId": session_id, "fallback": True})
         reply = response.generations[0].text.strip()
-        return JSONResponse(status_code=200, content={"reply": reply})
+        session_store.append_turns(
+            session_id, session,
+            {'type': 'user', 'content': payload.currentQuery},
+            {'type': 'bot', 'content': reply},
+        )
+        return JSONResponse(status_code=200, content={"reply": reply, "sessionId": session_id})
 
+    except HTTPException:
+        raise
+    except ClientDisconnected:
+        return Response(status_code=499)
     except Exception as e:
         logging.exception("Chat Two follow-up failed")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import FileResponse
+from starlette.datastructures import Headers, MutableHeaders
+import asyncio
+import hmac
+import os
+import time
+import logging
+from model.config import CONFIG
+from model.profiler import PROFILE_MODES, ProfileCapture, ProfileStore
+
+router = APIRouter()
+
+# Profiling is off unless a token is configured; callers opt in per request:
+#   curl -H "X-Profile: cprofile" -H "X-Profile-Token: $PROFILE_TOKEN" ...
+# and, once the response has ended, fetch the result from
+# /api/profiles/{X-Profile-Id}/{artifact}
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+
+profile_store = ProfileStore()
+
+def is_authorized(headers) -> bool:
+    token = headers.get("X-Profile-Token", "")
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+def with_headers(send, extra):
+    """
+    Wrap an ASGI `send` so the response start carries `extra` headers.
+    """
+    async def wrapped(message):
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(scope=message)
+            for name, value in extra.items():
+                headers.append(name, value)
+        await send(message)
+    return wrapped
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware, so requests without X-Profile go straight to the
+    app. A profiled request is captured until its last body chunk is sent,
+    streamed (SSE) responses included, or for at most PROFILE_MAX_SECONDS.
+    Headers go out before the body, so the profile id is picked up front;
+    the profile can be fetched once the response has ended.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        mode = headers.get("X-Profile")
+        if not mode:
+            return await self.app(scope, receive, send)
+        if mode not in PROFILE_MODES or not is_authorized(headers):
+            logging.warning(f"Ignoring profiling request for {scope['path']}")
+            return await self.app(scope, receive, send)
+
+        capture = ProfileCapture(mode)
+        try:
+            started = capture.start()
+        except Exception:
+            logging.exception(f"Could not start profiling {scope['path']}")
+            return await self.app(scope, receive, send)
+        if not started:
+            return await self.app(scope, receive, with_headers(send, {"X-Profile-Status": "busy"}))
+
+        profile_id = profile_store.new_id()
+        status = None
+
+        async def send_profiled(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        cap = asyncio.get_running_loop().call_later(CONFIG['PROFILE_MAX_SECONDS'], capture.expire)
+        start_time = time.time()
+        try:
+            await self.app(scope, receive, with_headers(send_profiled, {"X-Profile-Id": profile_id}))
+        finally:
+            cap.cancel()
+            # The heap snapshot diff and the disk writes below take a while;
+            # keep them off the event loop so other requests are not stalled
+            capture.halt()
+            artifacts = await asyncio.to_thread(capture.stop)
+            elapsed_time = time.time() - start_time
+            meta = f"{scope['method']} {scope['path']}\nmode: {mode}\nstatus: {status}\nelapsed: {elapsed_time:.3f}s\n"
+            await asyncio.to_thread(profile_store.save, artifacts, meta, profile_id)
+
+@router.get("/api/profiles")
+async def list_profiles(request: Request):
+    if not is_authorized(request.headers):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {"profiles": profile_store.list()}
+
+@router.get("/api/profiles/{profile_id}/{artifact}")
+async def download_profile(profile_id: str, artifact: str, request: Request):
+    if not is_authorized(request.headers):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    path = profile_store.path(profile_id, artifact)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=f"{profile_id}-{artifact}")
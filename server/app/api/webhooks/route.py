@@ -0,0 +1,127 @@
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import JSONResponse
+import aiohttp
+import hashlib
+import hmac
+import json
+import os
+import logging
+from app.api.ai_reviewer.route import MAX_FILES, fetch_file_content
+from app.routers.models import IssueDetails, matcher
+from model.config import CONFIG
+from model.deadline import Deadline
+from model.github import list_repo_files, SOURCE_FILE_PATTERN
+from model.precompute import PRIORITY_ISSUE, PRIORITY_PUSH, PrecomputeJob, PrecomputeQueue
+
+router = APIRouter()
+
+# Same secret as configured on the GitHub webhook; ingestion is off without it
+GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET")
+
+ISSUE_ACTIONS = {"opened", "edited", "reopened"}
+
+precompute_queue = PrecomputeQueue()
+
+def verify_signature(body: bytes, signature: str) -> bool:
+    expected = "sha256=" + hmac.new(GITHUB_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or "")
+
+def issue_job(payload: dict) -> PrecomputeJob:
+    """
+    Rank the repo's files against the issue, as /analyse-issue would, so
+    the result is cached and the files the reviewer reads are downloaded.
+    """
+    repository = payload["repository"]
+    owner, repo = repository["owner"]["login"], repository["name"]
+    issue = payload["issue"]
+    issue_data = IssueDetails(
+        owner=owner,
+        repo=repo,
+        title=issue["title"],
+        description=issue.get("body") or "",
+        labels=[label["name"] for label in issue.get("labels", [])]
+    ).dict()
+    branch = repository["default_branch"]
+
+    async def run():
+        deadline = Deadline(CONFIG['PRECOMPUTE_JOB_DEADLINE'])
+        async with aiohttp.ClientSession() as session:
+            files = await list_repo_files(session, owner, repo, branch)
+        result = await matcher.match_files(issue_data, files, deadline)
+        for match in result.get("filename_matches", [])[:MAX_FILES]:
+            await fetch_file_content(match["download_url"], match["content_hash"], deadline)
+        logging.info(f"Precomputed {owner}/{repo}#{issue['number']}: {result.get('files_processed', 0)} files")
+
+    return PrecomputeJob(f"issue:{owner}/{repo}#{issue['number']}", f"{owner}/{repo}", PRIORITY_ISSUE, run)
+
+def push_job(payload: dict) -> PrecomputeJob:
+    """
+    Refresh the repo's stored embeddings to the pushed commit: blobs it
+    added or changed are embedded, blobs it removed are evicted.
+    """
+    repository = payload["repository"]
+    owner, repo = repository["owner"]["login"], repository["name"]
+    branch = repository["default_branch"]
+    after = payload["after"]
+
+    async def run():
+        deadline = Deadline(CONFIG['PRECOMPUTE_JOB_DEADLINE'])
+        result = await matcher.refresh_repo(owner, repo, branch, after, deadline)
+        logging.info(f"Refreshed {owner}/{repo}@{after[:7]}: {result['added']} added, {result['modified']} modified, "
+                     f"{result['removed']} removed; {result['embedded']} embedded, {result['evicted']} evicted, "
+                     f"{len(result['degraded_files'])} failed")
+
+    # Each push supersedes the last, so a queued refresh just moves to the newest commit
+    return PrecomputeJob(f"push:{owner}/{repo}", f"{owner}/{repo}", PRIORITY_PUSH, run)
+
+# GitHub lists at most this many commits in a push payload
+PUSH_PAYLOAD_MAX_COMMITS = 20
+
+def touches_source_files(payload: dict) -> bool:
+    """
+    Whether the push may have changed a source file. Only a full commit
+    list can rule that out: a capped one, or an empty one (e.g. a force
+    push back to an older commit), always counts as a change.
+    """
+    commits = payload.get("commits", [])
+    if not commits or len(commits) >= PUSH_PAYLOAD_MAX_COMMITS:
+        return True
+    return any(
+        SOURCE_FILE_PATTERN.search(path)
+        for commit in commits
+        for path in commit.get("added", []) + commit.get("modified", []) + commit.get("removed", [])
+    )
+
+@router.post("/github", status_code=202)
+async def github_webhook(request: Request):
+    if not GITHUB_WEBHOOK_SECRET:
+        raise HTTPException(status_code=404, detail="Webhook ingestion is not configured")
+    body = await request.body()
+    if not verify_signature(body, request.headers.get("X-Hub-Signature-256")):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+    event = request.headers.get("X-GitHub-Event", "")
+    try:
+        payload = json.loads(body)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+
+    if event == "ping":
+        return {"status": "pong"}
+    if event == "issues" and payload.get("action") in ISSUE_ACTIONS:
+        job = issue_job(payload)
+    elif event == "push" and payload.get("ref") == f"refs/heads/{payload['repository']['default_branch']}":
+        if not touches_source_files(payload):
+            return {"status": "ignored", "reason": "no source files changed"}
+        job = push_job(payload)
+    else:
+        return {"status": "ignored"}
+
+    if not precompute_queue.enqueue(job):
+        logging.warning(f"Precompute queue full; dropping {job.key}")
+        return JSONResponse(status_code=503, content={"status": "queue full"}, headers={"Retry-After": "60"})
+    return {"status": "queued", "job": job.key}
+
+@router.get("/status")
+async def webhook_status():
+    return precompute_queue.status()
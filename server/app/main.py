@@ -5,6 +5,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.ai_reviewer.route import router as ai_reviewer_router
 from app.api.ai_suggest.route import router as ai_suggest_router
 from app.api.chatone_followup.route import router as chatone_followup_router
+from app.api.chattwo_followup.route import router as chattwo_followup_router
+from app.api.profiles.route import router as profiles_router, ProfilingMiddleware
+from app.api.webhooks.route import router as webhooks_router
+from app.routers.models import router as models_router
 
 app = FastAPI(
     title="Issuezz",
@@ -27,10 +31,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in per-request profiling, see app/api/profiles/route.py
+app.add_middleware(ProfilingMiddleware)
+
 # Register routers with appropriate prefixes
 app.include_router(ai_reviewer_router, prefix="/api/ai_reviewer", tags=["AI Reviewer"])
 app.include_router(ai_suggest_router, prefix="/api/ai_suggest", tags=["AI Suggest"])
 app.include_router(chatone_followup_router, prefix="/api/chatone_followup", tags=["Chat Follow-up"])
+app.include_router(chattwo_followup_router, prefix="/api/chattwo_followup", tags=["Chat Follow-up"])
+app.include_router(models_router)
+app.include_router(profiles_router, tags=["Profiling"])
+app.include_router(webhooks_router, prefix="/api/webhooks", tags=["Webhooks"])
 
 # Root route
 @app.get("/")
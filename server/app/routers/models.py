@@ -1,16 +1,22 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional
+from model.deadline import ClientDisconnected, Deadline, cancel_on_disconnect
 from model.matcher import IssueMatcher
 import time
 import json
 
 router = APIRouter(prefix="/api", tags=["issue-analysis"])
 
+# One matcher per process: under gunicorn's preload_app it is built in the
+# master, so the model it loads is shared copy-on-write by every worker
+matcher = IssueMatcher()
+
 class FileInfo(BaseModel):
     name: str
     path: str
     download_url: str
+    sha: Optional[str] = None  # git blob SHA; lets already-embedded files skip the download
 
 class IssueDetails(BaseModel):
     owner: str
@@ -30,33 +36,38 @@ class IssueAnalysisResponse(BaseModel):
     matches: dict
     status: str
     message: str
+    partial: bool = False
 
 @router.post("/analyse-issue", response_model=IssueAnalysisResponse)
-async def analyze_issue(request: IssueAnalysisRequest):
+async def analyze_issue(request: IssueAnalysisRequest, http_request: Request):
     try:
-        # Initialize the matcher
-        matcher = IssueMatcher()
-        
+        deadline = Deadline.from_headers(http_request.headers)
         start_time = time.time()
         
-        # Run the matching
-        result = await matcher.match_files(
+        # Run the matching, abandoning it if the client goes away
+        result = await cancel_on_disconnect(http_request, matcher.match_files(
             request.issueDetails.dict(),
-            [file.dict() for file in request.filteredFiles]
-        )
+            [file.dict() for file in request.filteredFiles],
+            deadline
+        ))
         
         end_time = time.time()
         elapsed_time = end_time - start_time
+        partial = bool(result.get("partial"))
         
         return IssueAnalysisResponse(
             elapsed_time=elapsed_time,
             matches=result,
             status="success",
-            message="Issue analysis completed successfully"
+            message="Deadline reached; ranking covers the files processed so far" if partial
+                    else "Issue analysis completed successfully",
+            partial=partial
         )
-    
+
+    except ClientDisconnected:
+        return Response(status_code=499)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error analyzing issue: {str(e)}"
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,98 @@
+# benchmark.py
+# Fire concurrent /api/analyse-issue requests at a running server and report
+# latency plus per-worker memory, e.g.
+#   gunicorn -c gunicorn_conf.py app.main:app &
+#   python benchmark.py --pid $(pgrep -of "gunicorn -c gunicorn_conf.py")
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import aiohttp
+from test_run import sampleinput
+
+
+def read_memory(pid):
+    """
+    Return (RSS, PSS) in MB for a process. PSS splits shared pages between
+    the processes mapping them, so it shows what copy-on-write sharing saves.
+    """
+    rss = pss = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1])
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return rss / 1024, pss / 1024
+
+
+def worker_pids(master_pid):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/status") as f:
+                for line in f:
+                    if line.startswith("PPid:") and int(line.split()[1]) == master_pid:
+                        pids.append(int(entry))
+                        break
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return sorted(pids)
+
+
+def report_memory(master_pid):
+    for label, pid in [("master", master_pid)] + [("worker", p) for p in worker_pids(master_pid)]:
+        rss, pss = read_memory(pid)
+        print(f"  {label:<6} pid={pid:<7} rss={rss:8.1f} MB  pss={pss:8.1f} MB")
+
+
+async def run(url, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(session):
+        async with semaphore:
+            start = time.time()
+            async with session.post(url, json=sampleinput) as response:
+                await response.read()
+                response.raise_for_status()
+            latencies.append(time.time() - start)
+
+    start = time.time()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*[one(session) for _ in range(total)])
+    return time.time() - start, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000/api/analyse-issue")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pid", type=int, help="server master pid, to report per-worker memory")
+    args = parser.parse_args()
+
+    if args.pid:
+        print("Memory before:")
+        report_memory(args.pid)
+
+    elapsed, latencies = asyncio.run(run(args.url, args.requests, args.concurrency))
+    print(f"{len(latencies)} requests in {elapsed:.2f}s ({len(latencies) / elapsed:.1f} req/s)")
+    print(f"  p50={statistics.median(latencies):.3f}s  "
+          f"p99={latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.3f}s  max={latencies[-1]:.3f}s")
+
+    if args.pid:
+        print("Memory after:")
+        report_memory(args.pid)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# embedding_recall.py
+# Compare compressed embedding codecs against float32 scoring on real files:
+#   python embedding_recall.py                       # sample repo from test_run.py
+#   python embedding_recall.py --input request.json  # any /api/analyse-issue body
+#   python embedding_recall.py --input big_repo.json --fit-pca 128 --pca-out pca128.npy
+# A fit needs at least as many files as dimensions (the sample repo is too small).
+# Then serve with EMBEDDING_PCA_PATH=pca128.npy to store projected vectors.
+import argparse
+import asyncio
+import json
+import numpy as np
+from model.matcher import IssueMatcher
+from model.quantization import EmbeddingCodec, fit_pca, recall_at_k
+from test_run import sampleinput
+
+
+async def embed_files(matcher, files):
+    file_contents, _ = await matcher.fetch_all_files(files)
+    texts = [matcher.preprocess_content(f['content']) for f in file_contents]
+    return matcher.embedding_generator.generate_embeddings(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", help="JSON body of an /api/analyse-issue request")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--fit-pca", type=int, help="also fit a projection to this many dimensions")
+    parser.add_argument("--pca-out", help="where to save the fitted projection (.npy)")
+    args = parser.parse_args()
+
+    request = sampleinput
+    if args.input:
+        with open(args.input) as f:
+            request = json.load(f)
+
+    matcher = IssueMatcher()
+    vectors = asyncio.run(embed_files(matcher, request['filteredFiles']))
+    issue = request['issueDetails']
+    issue_vector = matcher.embedding_generator.generate_embedding(
+        f"{issue['title']} {issue.get('description', '')}"
+    ).cpu().numpy()
+    # The issue plus every file as a query, so the ranking is checked from many angles
+    queries = [issue_vector] + list(vectors)
+
+    codecs = [EmbeddingCodec(kind) for kind in ('float32', 'float16', 'int8')]
+    if args.fit_pca:
+        try:
+            projection = fit_pca(vectors, args.fit_pca)
+        except ValueError as e:
+            parser.error(f"{e}; use --input with a larger repo or a smaller --fit-pca")
+        if args.pca_out:
+            np.save(args.pca_out, projection)
+        codecs += [EmbeddingCodec(kind, projection=projection) for kind in ('float16', 'int8')]
+
+    baseline = codecs[0].row_dtype.itemsize
+    print(f"{len(vectors)} files, {len(queries)} queries, recall@{args.k} vs calculate_similarity")
+    for codec in codecs:
+        recall, max_error = recall_at_k(queries, vectors, codec, matcher.calculate_similarity, k=args.k)
+        size = codec.row_dtype.itemsize
+        print(f"  {codec.tag:<14} {size:5d} B/vector  {baseline / size:4.1f}x  "
+              f"recall={recall:.3f}  max score error={max_error:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# gunicorn_conf.py
+# Multi-worker deployment that shares one copy of the model across workers:
+#   gunicorn -c gunicorn_conf.py app.main:app
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app (and load MiniLM) in the master before forking, so the
+# weights live in pages every worker inherits copy-on-write
+preload_app = True
+
+# Sessions, cached results and fetched file bodies live in the process
+# unless they are kept in Redis, so a worker would not see another's
+USE_REDIS = os.getenv("USE_REDIS_CACHE", "false").lower() == "true"
+
+
+def on_starting(server):
+    if server.cfg.workers > 1 and not USE_REDIS:
+        raise RuntimeError(
+            f"{server.cfg.workers} workers need USE_REDIS_CACHE=true: follow-up chats "
+            "and cached results are per worker otherwise (set WEB_CONCURRENCY=1 to run without Redis)"
+        )
+
+
+def when_ready(server):
+    from model.embeddings import load_model
+    load_model()
+    # Move everything loaded so far out of the GC's reach; otherwise the first
+    # collection in each worker touches every object and un-shares its page
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Each worker gets its own slice of the CPU instead of all of them
+    # starting a full-width torch thread pool
+    import torch
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // server.cfg.workers))
@@ -0,0 +1,133 @@
+# server/model/batcher.py
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .config import CONFIG
+
+
+class _PendingEncode:
+    """
+    One caller's encode() call: its texts, the vectors filled in so far and
+    the future it is waiting on.
+    """
+
+    def __init__(self, texts, future):
+        self.texts = texts
+        self.vectors = [None] * len(texts)
+        self.next = 0  # index of the next text to schedule
+        self.remaining = len(texts)
+        self.future = future
+
+
+class InferenceBatcher:
+    """
+    Gathers encode calls from all in-flight requests into shared forward
+    passes.
+
+    Each call is queued under an owner (by default the asyncio task of the
+    request making it). A single worker waits up to max_wait after the first
+    text arrives, or until max_batch texts are queued, then fills the batch
+    round-robin across owners, one text each in turn, so a request embedding
+    hundreds of files cannot starve a request embedding one issue. Results are
+    routed back to each caller in order once all of its texts are encoded.
+    """
+
+    def __init__(self, encode_fn, max_batch=None, max_wait=None):
+        self.encode_fn = encode_fn
+        self.max_batch = max_batch or CONFIG['INFERENCE_MAX_BATCH']
+        self.max_wait = (max_wait if max_wait is not None else CONFIG['INFERENCE_MAX_WAIT_MS']) / 1000
+        self.queues = OrderedDict()  # owner -> deque of _PendingEncode
+        self.queued = 0
+        self.wakeup = None
+        self.worker = None
+        # One forward pass at a time; torch already parallelises inside it
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+    async def encode(self, texts, owner=None):
+        """
+        Encode `texts` as part of whatever batch is being formed; returns a
+        float32 array with one row per text.
+        """
+        if not texts:
+            return np.zeros((0, CONFIG['EMBEDDING_DIM']), dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        if self.worker is None or self.worker.done():
+            self.wakeup = asyncio.Event()
+            self.worker = loop.create_task(self._run())
+
+        pending = _PendingEncode(list(texts), loop.create_future())
+        owner = owner if owner is not None else asyncio.current_task()
+        self.queues.setdefault(owner, deque()).append(pending)
+        self.queued += len(texts)
+        self.wakeup.set()
+        return await pending.future
+
+    def _take(self):
+        """
+        Pop up to max_batch (pending, index) slots, one per owner per round.
+        """
+        batch = []
+        while len(batch) < self.max_batch and self.queues:
+            served = []
+            for owner in list(self.queues):
+                queue = self.queues[owner]
+                # Callers that gave up (deadline, disconnect) are skipped
+                while queue and queue[0].future.done():
+                    self.queued -= len(queue[0].texts) - queue[0].next
+                    queue.popleft()
+                if not queue:
+                    del self.queues[owner]
+                    continue
+                pending = queue[0]
+                batch.append((pending, pending.next))
+                pending.next += 1
+                self.queued -= 1
+                if pending.next == len(pending.texts):
+                    queue.popleft()
+                served.append(owner)
+                if len(batch) >= self.max_batch:
+                    break
+            # Owners served this round go to the back, so a batch that fills
+            # up mid-round starts the next one with whoever missed out
+            for owner in served:
+                if owner in self.queues:
+                    self.queues.move_to_end(owner)
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.queued:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+
+            # Give other requests up to max_wait to join this batch
+            deadline = loop.time() + self.max_wait
+            while self.queued < self.max_batch and (remaining := deadline - loop.time()) > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = self._take()
+            if not batch:
+                continue
+            try:
+                vectors = await loop.run_in_executor(
+                    self.executor, self.encode_fn, [p.texts[i] for p, i in batch]
+                )
+            except Exception as e:
+                logging.exception("Batched inference failed")
+                for pending, _ in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                continue
+
+            for (pending, i), vector in zip(batch, vectors):
+                pending.vectors[i] = vector
+                pending.remaining -= 1
+                if pending.remaining == 0 and not pending.future.done():
+                    pending.future.set_result(np.stack(pending.vectors))
@@ -6,5 +6,55 @@ CONFIG = {
     'MAX_WORKERS': 5,
     'SIMILARITY_THRESHOLD': 0.1,
     'REQUEST_TIMEOUT': 5,
-    'BATCH_SIZE': 1000
-}
\ No newline at end of file
+    'BATCH_SIZE': 1000,
+    'EMBEDDING_DIM': 384,
+    # Stored embedding format: 'float32', 'float16' or 'int8' (see quantization.py)
+    'EMBEDDING_CODEC': 'int8',
+    # Cap on the embedding store (see embedding_store.py); it lives in RAM
+    # under /dev/shm by default, which Docker limits to 64MB
+    'EMBEDDING_STORE_MAX_BYTES': 48 * 1024 * 1024,
+    # Upstream file fetches (see fetcher.py)
+    'FETCH_INITIAL_CONCURRENCY': 10,
+    'FETCH_MIN_CONCURRENCY': 1,
+    'FETCH_MAX_CONCURRENCY': 50,
+    'FETCH_LATENCY_TOLERANCE': 3.0,
+    'FETCH_MAX_RETRIES': 3,
+    'FETCH_BACKOFF_BASE': 0.5,
+    'FETCH_BACKOFF_CAP': 8.0,
+    'FETCH_DEADLINE': 30,
+    # Server-side chat sessions (see session_store.py)
+    'SESSION_TTL': 3600,
+    'SESSION_MAX_SESSIONS': 1000,
+    'SESSION_MAX_TURNS': 50,
+    # Minimum classifier confidence to answer a chat query from the local cache
+    'FAST_PATH_MIN_CONFIDENCE': 0.8,
+    # File contents shared across routes (see content_store.py)
+    'CONTENT_STORE_MAX_BYTES': 64 * 1024 * 1024,
+    'CONTENT_STORE_TTL': 1800,
+    # Streaming match pipeline (see IssueMatcher.match_files)
+    'PIPELINE_DOWNLOAD_WORKERS': 32,
+    'PIPELINE_QUEUE_SIZE': 64,
+    'EMBED_BATCH_SIZE': 32,
+    'TOP_K_MATCHES': 100,
+    # Cross-request inference batching (see batcher.py)
+    'INFERENCE_MAX_BATCH': 64,
+    'INFERENCE_MAX_WAIT_MS': 5,
+    # End-to-end request deadline in seconds (see deadline.py)
+    'REQUEST_DEADLINE': 30,
+    'REQUEST_DEADLINE_MAX': 120,
+    # Per-request profiling (see profiler.py)
+    'PROFILE_SAMPLE_HZ': 100,
+    'PROFILE_MAX_SECONDS': 60,
+    'PROFILE_TRACEMALLOC_FRAMES': 10,
+    'PROFILE_TRACEMALLOC_TOP': 50,
+    'PROFILE_MAX_STORED': 20,
+    'PROFILE_MAX_BYTES': 50 * 1024 * 1024,
+    # Webhook-driven background precomputation (see precompute.py)
+    'PRECOMPUTE_WORKERS': 2,
+    'PRECOMPUTE_QUEUE_SIZE': 500,
+    'PRECOMPUTE_JOBS_PER_MINUTE': 30,
+    'PRECOMPUTE_BURST': 10,
+    'PRECOMPUTE_REPO_JOBS_PER_MINUTE': 6,
+    'PRECOMPUTE_REPO_BURST': 3,
+    'PRECOMPUTE_JOB_DEADLINE': 120
+}
@@ -0,0 +1,123 @@
+# server/model/content_store.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from .config import CONFIG
+from .embedding_store import blob_sha
+
+USE_REDIS = os.getenv("USE_REDIS_CACHE", "false").lower() == "true"
+
+
+class MemoryContentStore:
+    """
+    File contents in process memory, evicted least recently used first once
+    CONTENT_STORE_MAX_BYTES is exceeded.
+    """
+
+    def __init__(self):
+        self.contents = OrderedDict()  # content_hash -> (expires_at, content)
+        self.urls = {}  # download_url -> content_hash
+        self.size = 0
+        self.max_bytes = CONFIG['CONTENT_STORE_MAX_BYTES']
+        self.ttl = CONFIG['CONTENT_STORE_TTL']
+        self.lock = threading.Lock()
+
+    def get(self, content_hash):
+        with self.lock:
+            entry = self.contents.get(content_hash)
+            if not entry:
+                return None
+            if entry[0] < time.time():
+                self._evict(content_hash)
+                return None
+            self.contents.move_to_end(content_hash)
+            return entry[1]
+
+    def get_hash(self, download_url):
+        return self.urls.get(download_url)
+
+    def put(self, download_url, content_hash, content):
+        with self.lock:
+            if content_hash in self.contents:
+                self._evict(content_hash)
+            self.contents[content_hash] = (time.time() + self.ttl, content)
+            self.size += len(content)
+            if download_url:
+                self.urls[download_url] = content_hash
+            while self.size > self.max_bytes and len(self.contents) > 1:
+                self._evict(next(iter(self.contents)))
+            # URLs pointing at evicted content are dropped in bulk rather
+            # than tracked per hash
+            if len(self.urls) > 4 * len(self.contents):
+                self.urls = {u: h for u, h in self.urls.items() if h in self.contents}
+
+    def _evict(self, content_hash):
+        _, content = self.contents.pop(content_hash)
+        self.size -= len(content)
+
+
+class RedisContentStore:
+    """
+    File contents in Redis, shared by every worker; Redis handles expiry.
+    """
+
+    def __init__(self):
+        import redis
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.client = redis.Redis.from_url(redis_url)
+        self.ttl = CONFIG['CONTENT_STORE_TTL']
+
+    def get(self, content_hash):
+        raw_data = self.client.get(f"content:{content_hash}")
+        return raw_data.decode('utf-8') if raw_data else None
+
+    def get_hash(self, download_url):
+        raw_data = self.client.get(f"content_url:{download_url}")
+        return raw_data.decode() if raw_data else None
+
+    def put(self, download_url, content_hash, content):
+        pipe = self.client.pipeline()
+        pipe.setex(f"content:{content_hash}", self.ttl, content.encode('utf-8'))
+        if download_url:
+            pipe.setex(f"content_url:{download_url}", self.ttl, content_hash)
+        pipe.execute()
+
+
+class ContentStore:
+    """
+    Downloaded file contents shared by /analyse-issue, the reviewer and the
+    chat routes, keyed by content hash (the git blob SHA) and looked up by
+    download_url. Whichever route downloads a file first stores it; the
+    others pass references around instead of the raw body.
+    """
+
+    def __init__(self):
+        self.backend = RedisContentStore() if USE_REDIS else MemoryContentStore()
+
+    def put(self, download_url, content) -> str:
+        """
+        Store content and return its hash. Only content the server fetched
+        from `download_url` itself may be stored under that URL; pass None
+        for content a client sent, so it is only reachable by its hash.
+        """
+        content_hash = blob_sha(content)
+        self.backend.put(download_url, content_hash, content)
+        return content_hash
+
+    def get(self, content_hash=None, download_url=None):
+        """
+        Content by hash, falling back to the latest content stored for the URL.
+        """
+        content = self.backend.get(content_hash) if content_hash else None
+        if content is None and download_url:
+            latest_hash = self.backend.get_hash(download_url)
+            if latest_hash and latest_hash != content_hash:
+                content = self.backend.get(latest_hash)
+        return content
+
+    def get_hash(self, download_url):
+        return self.backend.get_hash(download_url)
+
+
+content_store = ContentStore()
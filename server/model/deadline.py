@@ -0,0 +1,90 @@
+# server/model/deadline.py
+import asyncio
+import time
+from .config import CONFIG
+
+DEADLINE_HEADER = "X-Request-Timeout"
+
+
+class Deadline:
+    """
+    An absolute point in time (time.monotonic()) a request must finish by,
+    carried through downloads, embedding and LLM calls.
+    """
+
+    def __init__(self, timeout: float):
+        self.at = time.monotonic() + timeout
+
+    @classmethod
+    def from_headers(cls, headers):
+        """
+        Deadline from the X-Request-Timeout header (seconds), falling back to
+        CONFIG['REQUEST_DEADLINE'] and capped at CONFIG['REQUEST_DEADLINE_MAX'].
+        """
+        timeout = CONFIG['REQUEST_DEADLINE']
+        value = headers.get(DEADLINE_HEADER) if headers else None
+        if value:
+            try:
+                timeout = float(value)
+            except ValueError:
+                pass
+        return cls(max(0.0, min(timeout, CONFIG['REQUEST_DEADLINE_MAX'])))
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.at
+
+    def loop_time(self) -> float:
+        # asyncio.timeout_at() takes event loop time, which is monotonic-based
+        # but not guaranteed to share time.monotonic()'s origin
+        return asyncio.get_running_loop().time() + self.remaining()
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def cancel_on_disconnect(request, coro, poll_interval=0.5):
+    """
+    Run `coro` but cancel it as soon as the client behind `request` goes
+    away, raising ClientDisconnected, so abandoned requests stop spending
+    downloads, embedding and LLM calls.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def call_with_deadline(deadline, fn, *args, **kwargs):
+    """
+    Run a blocking Cohere SDK call on a worker thread, raising
+    asyncio.TimeoutError once the deadline passes.
+
+    A thread cannot be interrupted, so the call also gets the time left as
+    its own HTTP timeout (the SDK's request_options); an abandoned call then
+    ends at the deadline instead of holding an executor thread that later
+    requests queue behind.
+    """
+    if deadline.expired():
+        raise asyncio.TimeoutError()
+    request_options = kwargs.pop('request_options', {})
+
+    def call():
+        # Measured once the thread starts, after any wait for a free worker
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        return fn(*args, request_options={**request_options, 'timeout_in_seconds': remaining}, **kwargs)
+
+    return await asyncio.wait_for(asyncio.to_thread(call), timeout=deadline.remaining())
@@ -0,0 +1,312 @@
+# server/model/embedding_store.py
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+from .config import CONFIG
+from .quantization import SCORE_CHUNK_ROWS, EmbeddingCodec
+
+
+def default_store_dir():
+    # /dev/shm keeps the files in RAM; every worker maps the same pages
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.getenv("EMBEDDING_STORE_DIR", os.path.join(base, "issuezz-embeddings"))
+
+
+def blob_sha(content: str) -> str:
+    """
+    Git blob SHA of a file's text, so stored embeddings line up with the
+    SHAs GitHub reports in repository trees.
+    """
+    data = content.encode('utf-8')
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+# How often (seconds) a writing process re-measures the store against its cap
+LIMIT_CHECK_INTERVAL = 10
+
+
+class _RepoIndex:
+    """
+    One process's view of a repo's key log, read incrementally.
+    """
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.index = {}  # key -> row
+        self.rows = 0  # rows written so far, live or evicted
+        self.offset = 0  # bytes of the log already applied
+        self.vectors = None
+        self.vector_rows = 0
+
+
+class EmbeddingStore:
+    """
+    Per-repo file embeddings kept in memory-mapped files shared by all workers.
+
+    Each repo gets a directory holding, per generation, `vectors.<n>.bin`
+    (compressed rows in the codec's format) and `index.<n>.log`, a key log
+    with one `+key` line per appended row and one `-key` line per eviction;
+    `current` names the live generation. Both files are append-only, so a
+    write costs O(batch) and readers catch up by reading only the log lines
+    added since their last look. Readers map the vector file read-only, so
+    the OS page cache holds a single copy no matter how many workers read it.
+    Writers serialise on an flock. Once evicted rows outnumber live ones
+    twice over, the live rows are copied to a new generation and `current`
+    switched over, so readers never see rows move under them. Past
+    EMBEDDING_STORE_MAX_BYTES the least recently written repos are dropped
+    whole. Stores written with different codecs live under separate roots.
+
+    The directory also holds `tree.json`, the path -> blob SHA listing of
+    the repo as of its last refresh (see IssueMatcher.refresh_repo).
+
+    Every method does blocking file I/O; async callers run them in a thread.
+    """
+
+    def __init__(self, root=None, codec=None):
+        self.codec = codec or EmbeddingCodec.from_config()
+        self.root = os.path.join(root or default_store_dir(), self.codec.tag)
+        self._indexes = {}  # repo -> _RepoIndex
+        self._lock = threading.Lock()  # guards _indexes across threads
+        self._last_limit_check = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    def _repo_dir(self, repo: str) -> str:
+        return os.path.join(self.root, repo.replace('/', '__'))
+
+    @staticmethod
+    def _generation(repo_dir) -> int:
+        try:
+            with open(os.path.join(repo_dir, 'current')) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    @staticmethod
+    def _write_file(path, data: str):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _load(self, repo: str) -> _RepoIndex:
+        """
+        Bring this process's view of the repo up to date; call with _lock held.
+        """
+        repo_dir = self._repo_dir(repo)
+        generation = self._generation(repo_dir)
+        state = self._indexes.get(repo)
+        if state is None or state.generation != generation:
+            state = self._indexes[repo] = _RepoIndex(generation)
+
+        try:
+            with open(os.path.join(repo_dir, f'index.{generation}.log'), 'rb') as f:
+                f.seek(state.offset)
+                data = f.read()
+        except FileNotFoundError:
+            # No writes yet, or compacted away since `current` was read
+            return state
+        # A line is only applied once complete; a torn write is finished or
+        # truncated by the next writer
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].decode().splitlines():
+            if line[0] == '+':
+                state.index[line[1:]] = state.rows
+                state.rows += 1
+            else:
+                state.index.pop(line[1:], None)
+        state.offset += end
+
+        if state.rows > state.vector_rows:
+            vectors_path = os.path.join(repo_dir, f'vectors.{generation}.bin')
+            try:
+                rows = os.path.getsize(vectors_path) // self.codec.row_dtype.itemsize
+            except FileNotFoundError:
+                rows = 0
+            state.vectors = np.memmap(vectors_path, dtype=self.codec.row_dtype, mode='r', shape=(rows,)) if rows else None
+            state.vector_rows = rows
+        return state
+
+    def _rows(self, repo: str, keys):
+        with self._lock:
+            state = self._load(repo)
+            if state.vectors is None:
+                return [], None
+            found = [k for k in keys if state.index.get(k, state.vector_rows) < state.vector_rows]
+            # Fancy indexing copies, so scoring can run without the lock
+            return found, state.vectors[[state.index[k] for k in found]] if found else None
+
+    def contains(self, repo: str, keys) -> set:
+        """
+        Return the subset of `keys` already stored for this repo.
+        """
+        with self._lock:
+            state = self._load(repo)
+            return {k for k in keys if state.index.get(k, state.vector_rows) < state.vector_rows}
+
+    def keys(self, repo: str) -> set:
+        """
+        Every key stored for this repo.
+        """
+        with self._lock:
+            return set(self._load(repo).index)
+
+    def get_many(self, repo: str, keys) -> dict:
+        """
+        Return {key: vector} for the keys already stored for this repo,
+        decoded to float32 in the codec's space (projected, if it uses PCA).
+        """
+        found, rows = self._rows(repo, keys)
+        if not found:
+            return {}
+        return dict(zip(found, self.codec.decode(rows)))
+
+    def score_many(self, repo: str, keys, query) -> dict:
+        """
+        Return {key: cosine similarity to `query`} for the stored keys,
+        scored directly on the compressed rows.
+        """
+        found, rows = self._rows(repo, keys)
+        if not found:
+            return {}
+        return dict(zip(found, (float(x) for x in self.codec.scores(query, rows))))
+
+    def put_many(self, repo: str, items: dict):
+        """
+        Append {key: float32 vector} for this repo. Keys already present are skipped.
+
+        The store is a cache: a failed write (e.g. /dev/shm full) is logged
+        and the vectors are simply recomputed next time.
+        """
+        if not items:
+            return
+        try:
+            self._append(repo, items)
+            self._enforce_limit(repo)
+        except OSError as e:
+            logging.error(f"Could not store embeddings for {repo}: {e}")
+
+    def _append(self, repo: str, items: dict):
+        repo_dir = self._repo_dir(repo)
+        os.makedirs(repo_dir, exist_ok=True)
+
+        with open(os.path.join(repo_dir, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with self._lock:
+                state = self._load(repo)
+                new = [(k, v) for k, v in items.items() if k not in state.index]
+                generation, rows, offset = state.generation, state.rows, state.offset
+            if not new:
+                return
+
+            vectors = self.codec.encode(np.stack([np.asarray(v, dtype=np.float32).reshape(-1) for _, v in new]))
+            # Vectors go first so a reader never sees a log line for a row
+            # that is not there; anything an earlier failed write left past
+            # the last complete line is cut off first
+            with open(os.path.join(repo_dir, f'vectors.{generation}.bin'), 'ab') as f:
+                f.truncate(rows * self.codec.row_dtype.itemsize)
+                f.write(vectors.tobytes())
+            with open(os.path.join(repo_dir, f'index.{generation}.log'), 'ab') as f:
+                f.truncate(offset)
+                f.write(''.join(f"+{k}\n" for k, _ in new).encode())
+
+    def _enforce_limit(self, current_repo: str):
+        """
+        Keep the store under EMBEDDING_STORE_MAX_BYTES by dropping whole
+        repos, least recently written first. The repo just written is kept.
+        Measured at most every LIMIT_CHECK_INTERVAL seconds per process.
+        """
+        now = time.monotonic()
+        if now - self._last_limit_check < LIMIT_CHECK_INTERVAL:
+            return
+        self._last_limit_check = now
+
+        repos = []
+        total = 0
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            try:
+                files = list(os.scandir(entry.path))
+                size = sum(f.stat().st_size for f in files)
+                mtime = max(f.stat().st_mtime for f in files) if files else 0
+            except FileNotFoundError:
+                continue
+            total += size
+            repos.append((mtime, size, entry.path))
+        current_dir = self._repo_dir(current_repo)
+        for mtime, size, repo_dir in sorted(repos):
+            if total <= CONFIG['EMBEDDING_STORE_MAX_BYTES']:
+                break
+            if repo_dir == current_dir:
+                continue
+            # Readers keep their mappings of the removed files until they reload
+            with open(os.path.join(repo_dir, '.lock'), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                shutil.rmtree(repo_dir, ignore_errors=True)
+            total -= size
+            logging.info(f"Embedding store over its size limit; dropped {os.path.basename(repo_dir)}")
+
+    def evict(self, repo: str, keys) -> int:
+        """
+        Drop the given keys from this repo and return how many were stored;
+        compacts into a new generation once most rows are dead.
+        """
+        repo_dir = self._repo_dir(repo)
+        if not os.path.isdir(repo_dir):
+            return 0
+
+        with open(os.path.join(repo_dir, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with self._lock:
+                state = self._load(repo)
+                evicted = {k for k in keys if k in state.index}
+                if not evicted:
+                    return 0
+                live = sorted((row, k) for k, row in state.index.items() if k not in evicted)
+                generation, rows, offset, vectors = state.generation, state.rows, state.offset, state.vectors
+
+            if rows <= 2 * len(live):
+                with open(os.path.join(repo_dir, f'index.{generation}.log'), 'ab') as f:
+                    f.truncate(offset)
+                    f.write(''.join(f"-{k}\n" for k in evicted).encode())
+                return len(evicted)
+
+            # Copy live rows to a new generation; readers holding the old one
+            # keep their mapping of it until they reload
+            new_generation = generation + 1
+            with open(os.path.join(repo_dir, f'vectors.{new_generation}.bin'), 'wb') as f:
+                for start in range(0, len(live), SCORE_CHUNK_ROWS):
+                    f.write(vectors[[row for row, _ in live[start:start + SCORE_CHUNK_ROWS]]].tobytes())
+            with open(os.path.join(repo_dir, f'index.{new_generation}.log'), 'w') as f:
+                f.write(''.join(f"+{k}\n" for _, k in live))
+            self._write_file(os.path.join(repo_dir, 'current'), str(new_generation))
+            for name in (f'vectors.{generation}.bin', f'index.{generation}.log'):
+                try:
+                    os.remove(os.path.join(repo_dir, name))
+                except FileNotFoundError:
+                    pass
+            return len(evicted)
+
+    def get_tree(self, repo: str) -> dict:
+        """
+        The {path: blob SHA} listing recorded by the last refresh, or {}.
+        """
+        try:
+            with open(os.path.join(self._repo_dir(repo), 'tree.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def put_tree(self, repo: str, tree: dict):
+        repo_dir = self._repo_dir(repo)
+        os.makedirs(repo_dir, exist_ok=True)
+        with open(os.path.join(repo_dir, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._write_file(os.path.join(repo_dir, 'tree.json'), json.dumps(tree))
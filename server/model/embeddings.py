@@ -1,11 +1,66 @@
 # embeddings.py
+import threading
 from sentence_transformers import SentenceTransformer
 import numpy as np
+from .batcher import InferenceBatcher
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+_model = None
+_model_lock = threading.Lock()
+_batcher = None
+
+
+def load_model():
+    """
+    Load the SentenceTransformer once per process and return it.
+
+    Called from the gunicorn master before workers are forked (see
+    gunicorn_conf.py) so every worker inherits the weights copy-on-write
+    instead of holding its own copy. Nothing is encoded here: running a
+    forward pass before fork would start torch's thread pool in the master,
+    which forked children cannot use safely.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                # Using a lightweight but effective model
+                _model = SentenceTransformer(MODEL_NAME)
+                _model.eval()
+    return _model
+
+
+def get_batcher(encode_fn):
+    """
+    The process-wide InferenceBatcher, so encode calls from every request
+    (and every EmbeddingGenerator) share forward passes.
+    """
+    global _batcher
+    if _batcher is None:
+        with _model_lock:
+            if _batcher is None:
+                _batcher = InferenceBatcher(encode_fn)
+    return _batcher
+
 
 class EmbeddingGenerator:
     def __init__(self):
-        # Using a lightweight but effective model
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.model = load_model()
+        self.batcher = get_batcher(self.generate_embeddings)
     
     def generate_embedding(self, text):
         return self.model.encode(text, convert_to_tensor=True)
+
+    def generate_embeddings(self, texts):
+        """
+        Encode a micro-batch in one forward pass; returns a float32 array.
+        """
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+    async def encode(self, texts, owner=None):
+        """
+        Encode texts in batches shared with other in-flight requests; the
+        preferred path from async code.
+        """
+        return await self.batcher.encode(texts, owner)
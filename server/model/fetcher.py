@@ -0,0 +1,164 @@
+# server/model/fetcher.py
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from urllib.parse import urlsplit
+import aiohttp
+from .config import CONFIG
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Weight of each reply in a host's moving-average latency
+LATENCY_SMOOTHING = 0.1
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header (delta-seconds or HTTP-date).
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostLimiter:
+    """
+    AIMD concurrency limit for one upstream host.
+
+    The limit grows by roughly one slot per round trip while requests succeed
+    with every slot in use, and is halved on 429s, timeouts and 5xx. A reply
+    well above the host's recent typical latency (a moving average, so it
+    follows the files being fetched and the host's load) shrinks it gently,
+    before the host starts throttling outright. Either decrease happens at
+    most once per round trip: replies to requests already in flight when the
+    host slowed down report the same signal.
+    """
+
+    def __init__(self):
+        self.limit = float(CONFIG['FETCH_INITIAL_CONCURRENCY'])
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.typical_latency = None
+        self.last_decrease = 0.0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            while True:
+                wait = self.blocked_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                try:
+                    await asyncio.wait_for(self.condition.wait(), timeout=wait if wait > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _decrease(self, factor):
+        now = time.monotonic()
+        if now - self.last_decrease > (self.typical_latency or 1.0):
+            self.limit = max(CONFIG['FETCH_MIN_CONCURRENCY'], self.limit * factor)
+            self.last_decrease = now
+
+    async def release(self, latency=None, throttled=False, retry_after=None):
+        async with self.condition:
+            # Only a limit that was actually reached has shown it is too low
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            if throttled:
+                self._decrease(0.5)
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            elif latency is not None:
+                if self.typical_latency is None:
+                    self.typical_latency = latency
+                if latency > self.typical_latency * CONFIG['FETCH_LATENCY_TOLERANCE']:
+                    self._decrease(0.9)
+                elif saturated:
+                    self.limit = min(CONFIG['FETCH_MAX_CONCURRENCY'], self.limit + 1 / self.limit)
+                self.typical_latency += LATENCY_SMOOTHING * (latency - self.typical_latency)
+            self.condition.notify_all()
+
+
+class UpstreamFetcher:
+    """
+    Fetches file contents with per-host adaptive concurrency, retries with
+    jittered backoff and a deadline shared by the whole batch. Limits are
+    kept per host for the life of the process, so what one request learns
+    about GitHub's throttling carries over to the next.
+    """
+
+    def __init__(self):
+        self.limiters = {}
+
+    def limiter_for(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.limiters:
+            self.limiters[host] = HostLimiter()
+        return self.limiters[host]
+
+    def backoff(self, attempt):
+        # Full jitter: spreads retries out instead of having them land together
+        return random.uniform(0, min(CONFIG['FETCH_BACKOFF_CAP'], CONFIG['FETCH_BACKOFF_BASE'] * 2 ** attempt))
+
+    async def fetch_text(self, session, url, deadline):
+        """
+        Return (text, None) on success or (None, reason) once the file is
+        given up on. `deadline` is a time.monotonic() value.
+        """
+        limiter = self.limiter_for(url)
+        reason = "deadline exceeded"
+        for attempt in range(CONFIG['FETCH_MAX_RETRIES'] + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None, reason
+
+            try:
+                await asyncio.wait_for(limiter.acquire(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return None, reason
+
+            start = time.monotonic()
+            retry_after = None
+            timeout = aiohttp.ClientTimeout(total=min(CONFIG['REQUEST_TIMEOUT'], deadline - start))
+            try:
+                async with session.get(url, timeout=timeout) as response:
+                    if response.status == 200:
+                        text = await response.text()
+                        await limiter.release(latency=time.monotonic() - start)
+                        return text, None
+                    reason = f"HTTP {response.status}"
+                    if response.status not in RETRYABLE_STATUSES:
+                        await limiter.release(latency=time.monotonic() - start)
+                        return None, reason
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    await limiter.release(throttled=True, retry_after=retry_after)
+            except asyncio.TimeoutError:
+                reason = "timeout"
+                await limiter.release(throttled=True)
+            except aiohttp.ClientError as e:
+                reason = f"connection error: {e}"
+                await limiter.release(throttled=True)
+            except asyncio.CancelledError:
+                await limiter.release()
+                raise
+            except Exception as e:
+                logging.exception(f"Error downloading {url}: {e}")
+                await limiter.release()
+                return None, f"error: {e}"
+
+            delay = max(retry_after or 0, self.backoff(attempt))
+            if time.monotonic() + delay >= deadline:
+                return None, reason
+            logging.info(f"Retrying {url} in {delay:.2f}s ({reason})")
+            await asyncio.sleep(delay)
+        return None, reason
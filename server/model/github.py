@@ -0,0 +1,95 @@
+# server/model/github.py
+import os
+import re
+import aiohttp
+
+GITHUB_API_URL = "https://api.github.com"
+RAW_URL = "https://raw.githubusercontent.com"
+
+# Same file types the client sends to /api/analyse-issue (client/app/utils/issuerep_det.ts)
+SOURCE_FILE_PATTERN = re.compile(r"\.(js|py|java|cpp|html|json|xml|rb|go|php|ts|tsx|jsx|sh|yml|yaml)$", re.I)
+
+
+def github_headers():
+    headers = {'Accept': 'application/vnd.github.v3+json'}
+    token = os.getenv("GITHUB_TOKEN")
+    if token:
+        headers['Authorization'] = f"token {token}"
+    return headers
+
+
+def raw_url(owner, repo, ref, path):
+    return f"{RAW_URL}/{owner}/{repo}/{ref}/{path}"
+
+
+def file_info(owner, repo, ref, path, sha=None):
+    """
+    A file entry shaped like the client's filteredFiles, so cache keys and
+    download URLs match what user requests produce.
+    """
+    info = {'name': path.rsplit('/', 1)[-1], 'path': path, 'download_url': raw_url(owner, repo, ref, path)}
+    if sha:
+        info['sha'] = sha
+    return info
+
+
+async def _get_tree(session, owner, repo, sha, recursive):
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/git/trees/{sha}" + ("?recursive=1" if recursive else "")
+    async with session.get(url, headers=github_headers(), timeout=aiohttp.ClientTimeout(total=30)) as response:
+        response.raise_for_status()
+        return await response.json()
+
+
+async def _walk_tree(session, owner, repo, sha, prefix=''):
+    """
+    Blob entries under tree `sha` as (path, blob SHA), and whether the
+    listing is complete. GitHub truncates recursive listings of large trees,
+    so a truncated one is redone a level at a time, recursing into subtrees.
+    """
+    tree = await _get_tree(session, owner, repo, sha, recursive=True)
+    if not tree.get('truncated'):
+        return [(prefix + item['path'], item['sha']) for item in tree.get('tree', []) if item.get('type') == 'blob'], True
+
+    tree = await _get_tree(session, owner, repo, sha, recursive=False)
+    complete = not tree.get('truncated')
+    blobs = []
+    for item in tree.get('tree', []):
+        if item.get('type') == 'blob':
+            blobs.append((prefix + item['path'], item['sha']))
+        elif item.get('type') == 'tree':
+            subtree, subtree_complete = await _walk_tree(session, owner, repo, item['sha'], f"{prefix}{item['path']}/")
+            blobs.extend(subtree)
+            complete = complete and subtree_complete
+    return blobs, complete
+
+
+async def list_repo_tree(session, owner, repo, ref):
+    """
+    Source files in the repo at `ref` with their blob SHAs, and whether the
+    listing is complete (False only if GitHub truncated even a single
+    directory's listing). Small repos take one recursive git tree call.
+    """
+    blobs, complete = await _walk_tree(session, owner, repo, ref)
+    files = [file_info(owner, repo, ref, path, sha) for path, sha in blobs if SOURCE_FILE_PATTERN.search(path)]
+    return files, complete
+
+
+async def list_repo_files(session, owner, repo, ref):
+    """
+    Source files in the repo at `ref` with their blob SHAs, from recursive
+    git tree calls instead of walking the contents API.
+    """
+    files, _ = await list_repo_tree(session, owner, repo, ref)
+    return files
+
+
+async def branch_head(session, owner, repo, branch):
+    """
+    SHA of the commit `branch` points at, so a refresh can list and download
+    one consistent snapshot (raw branch URLs can lag behind a push).
+    """
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/branches/{branch}"
+    async with session.get(url, headers=github_headers(), timeout=aiohttp.ClientTimeout(total=30)) as response:
+        response.raise_for_status()
+        data = await response.json()
+    return data['commit']['sha']
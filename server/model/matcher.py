@@ -1,11 +1,19 @@
 #matcher.py
-from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, suppress
 import asyncio
+import heapq
 import aiohttp
 from typing import Dict, List
+import time
 import numpy as np
 from .cache import Cache
+from .config import CONFIG
+from .content_store import content_store
+from .deadline import Deadline
 from .embeddings import EmbeddingGenerator
+from .embedding_store import EmbeddingStore, blob_sha
+from .fetcher import UpstreamFetcher
+from .github import branch_head, file_info, list_repo_tree
 import logging
 
 #logging.basicConfig(level=logging.INFO)
@@ -14,31 +22,218 @@ class IssueMatcher:
     def __init__(self):
         self.cache = Cache()
         self.embedding_generator = EmbeddingGenerator()
+        self.embedding_store = EmbeddingStore()
+        self.fetcher = UpstreamFetcher()  # Adapts per-host concurrency to throttling
+        self.content_store = content_store  # Shared with the reviewer and chat routes
         self.max_workers = 5
-        self.semaphore = asyncio.Semaphore(10)  # Limit concurrent requests
     
-    async def download_file_content(self, session, file):
+    async def download_file_content(self, session, file, fetch_deadline, refresh=False):
+        """
+        Download one file by `fetch_deadline`, a time.monotonic() value.
+        Returns (file_data, None) or (None, degraded_entry).
+
+        A `fetch_url` on the file, if present, is fetched instead of its
+        download_url (e.g. a commit-pinned URL), and the content is stored
+        under the download_url. With `refresh` the content store is bypassed.
+        A file listed with a blob SHA is only served from the store under
+        that SHA, never by URL, so a body from before a push is not ranked
+        under the new SHA.
+        """
         if not file.get('download_url'):
             logging.warning(f"Skipping file without URL: {file.get('path', 'Unknown')}")
-            return None
-        try:
-            async with self.semaphore:  # Prevent excessive concurrent requests
-                async with session.get(file['download_url'], timeout=5) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        return {'path': file['path'], 'content': content, 'download_url': file['download_url']}
-                    logging.error(f"Failed to download {file['path']} (HTTP {response.status})")
-        except asyncio.TimeoutError:
-            logging.error(f"Timeout when downloading {file['path']}")
-        except Exception as e:
-            logging.exception(f"Error downloading {file['path']}: {e}")
-        return None
+            return None, {'path': file.get('path', 'Unknown'), 'reason': "missing download_url"}
+        if refresh:
+            content = None
+        elif file.get('sha'):
+            content = self.content_store.get(content_hash=file['sha'])
+        else:
+            content = self.content_store.get(download_url=file['download_url'])
+        if content is None:
+            content, reason = await self.fetcher.fetch_text(session, file.get('fetch_url') or file['download_url'], fetch_deadline)
+            if content is None:
+                logging.error(f"Failed to download {file['path']} ({reason})")
+                return None, {'path': file['path'], 'reason': reason}
+            self.content_store.put(file['download_url'], content)
+        return {'path': file['path'], 'content': content, 'download_url': file['download_url']}, None
+
+    async def stream_file_contents(self, files, degraded, deadline=None, refresh=False):
+        """
+        Async generator yielding downloaded files as they arrive.
+
+        A fixed pool of download workers feeds a bounded queue, so the number
+        of file bodies held at once (in flight, queued, or in the consumer's
+        current batch) does not grow with the file count; a slow consumer
+        makes the workers wait. Files that could not be fetched are appended to
+        `degraded`. Downloads stop at the request's deadline, if given.
+        """
+        fetch_deadline = time.monotonic() + CONFIG['FETCH_DEADLINE']
+        if deadline:
+            fetch_deadline = min(fetch_deadline, deadline.at)
+        queue = asyncio.Queue(maxsize=CONFIG['PIPELINE_QUEUE_SIZE'])
+        pending = iter(files)
+
+        async with aiohttp.ClientSession() as session:
+            async def worker():
+                # Workers share one iterator; each takes the next file when free
+                for file in pending:
+                    result, failure = await self.download_file_content(session, file, fetch_deadline, refresh)
+                    if failure:
+                        degraded.append(failure)
+                    if result:
+                        await queue.put(result)
+
+            async def run_workers():
+                results = await asyncio.gather(
+                    *[worker() for _ in range(CONFIG['PIPELINE_DOWNLOAD_WORKERS'])],
+                    return_exceptions=True
+                )
+                for r in results:
+                    if isinstance(r, Exception):
+                        logging.error(f"Download worker failed: {r}")
+                await queue.put(None)
+
+            producer = asyncio.create_task(run_workers())
+            try:
+                while (item := await queue.get()) is not None:
+                    yield item
+            finally:
+                # Wait for the workers to wind down before the session closes
+                producer.cancel()
+                with suppress(asyncio.CancelledError):
+                    await producer
 
     async def fetch_all_files(self, files):
+        """
+        Download all files within one shared deadline.
+        Returns (file_contents, degraded_files).
+        """
+        degraded = []
+        file_contents = [f async for f in self.stream_file_contents(files, degraded)]
+        return file_contents, degraded
+
+    async def score_file_stream(self, file_stream, repo, issue_vector):
+        """
+        Async generator turning downloaded files into (file_data, similarity)
+        pairs in micro-batches of EMBED_BATCH_SIZE. Each batch goes to the
+        shared inference batcher while downloads keep filling the queue, and
+        file bodies are dropped as soon as their batch is embedded. Stored
+        embeddings are scored in their compressed form without decoding.
+        """
+        async def flush(batch):
+            # Reuse embeddings any worker already stored for this content
+            keys = [blob_sha(x['content']) for x in batch]
+            scores = await asyncio.to_thread(self.embedding_store.score_many, repo, keys, issue_vector)
+            missing = [(k, x) for k, x in zip(keys, batch) if k not in scores]
+            if missing:
+                texts = [self.preprocess_content(x['content']) for _, x in missing]
+                vectors = await self.embedding_generator.encode(texts)
+                computed = {k: v for (k, _), v in zip(missing, vectors)}
+                await asyncio.to_thread(self.embedding_store.put_many, repo, computed)
+                # Score through the codec like stored files, so a file ranks
+                # the same whether or not it was already in the store
+                codec = self.embedding_store.codec
+                for k, score in zip(computed, codec.scores(issue_vector, codec.encode(vectors))):
+                    scores[k] = float(score)
+            return [
+                ({'path': x['path'], 'download_url': x['download_url'], 'content_hash': k}, scores[k])
+                for k, x in zip(keys, batch)
+            ]
+
+        batch = []
+        async with aclosing(file_stream):
+            async for file in file_stream:
+                batch.append(file)
+                if len(batch) >= CONFIG['EMBED_BATCH_SIZE']:
+                    for pair in await flush(batch):
+                        yield pair
+                    batch = []
+        if batch:
+            for pair in await flush(batch):
+                yield pair
+
+    async def refresh_repo(self, owner, repo, branch, commit=None, deadline=None):
+        """
+        Bring a repo's stored embeddings up to date with its tree on `branch`
+        (at `commit`, if given, else the branch head).
+
+        The tree's path -> blob SHA listing is diffed against the one
+        recorded by the previous refresh. Only blobs not already stored are
+        downloaded and embedded, and stored blobs not in the tree are
+        evicted, so the cost follows the churn rather than the repo size. Files are
+        fetched at the commit but stored under their branch URLs, the ones
+        users request. If GitHub could not list the whole tree, what it did
+        list is embedded but nothing is evicted and the tree is not recorded,
+        since absent files may still exist. Returns counts of what changed
+        and what was done.
+        """
+        name = f"{owner}/{repo}"
         async with aiohttp.ClientSession() as session:
-            tasks = [self.download_file_content(session, file) for file in files]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            return [r for r in results if r]
+            commit = commit or await branch_head(session, owner, repo, branch)
+            listed, complete = await list_repo_tree(session, owner, repo, commit)
+        files = [
+            {**file_info(owner, repo, branch, f['path'], f['sha']), 'fetch_url': f['download_url']}
+            for f in listed
+        ]
+
+        tree = {f['path']: f['sha'] for f in files}
+        previous = await asyncio.to_thread(self.embedding_store.get_tree, name)
+        # Everything stored for the repo that is not in this tree goes, not
+        # just what the previous tree listed: user requests (other branches,
+        # files fetched before any refresh) add embeddings too
+        removed = await asyncio.to_thread(self.embedding_store.keys, name) - set(tree.values())
+        stored = await asyncio.to_thread(self.embedding_store.contains, name, set(tree.values()))
+        changed = [f for f in files if f['sha'] not in stored]
+
+        result = await self.store_embeddings(name, changed, deadline, refresh=True)
+        if complete:
+            evicted = await asyncio.to_thread(self.embedding_store.evict, name, removed)
+            await asyncio.to_thread(self.embedding_store.put_tree, name, tree)
+        else:
+            logging.warning(f"Tree listing of {name}@{commit[:7]} was truncated; skipping eviction")
+            evicted = 0
+        return {
+            'commit': commit,
+            'complete': complete,
+            'files': len(tree),
+            'added': sum(1 for p in tree if p not in previous),
+            'modified': sum(1 for p, sha in tree.items() if p in previous and previous[p] != sha),
+            'removed': sum(1 for p in previous if p not in tree),
+            'embedded': result['embedded'],
+            'evicted': evicted,
+            'degraded_files': result['degraded_files']
+        }
+
+    async def store_embeddings(self, repo, files, deadline=None, refresh=False):
+        """
+        Download and embed `files` into the repo's embedding store without
+        scoring them, for background precomputation. Returns
+        {'embedded', 'reused', 'degraded_files'}.
+        """
+        degraded = []
+        embedded = reused = 0
+
+        async def flush(batch):
+            nonlocal embedded, reused
+            keys = [blob_sha(x['content']) for x in batch]
+            stored = await asyncio.to_thread(self.embedding_store.contains, repo, keys)
+            missing = {k: x for k, x in zip(keys, batch) if k not in stored}
+            reused += len(batch) - len(missing)
+            if missing:
+                texts = [self.preprocess_content(x['content']) for x in missing.values()]
+                vectors = await self.embedding_generator.encode(texts)
+                await asyncio.to_thread(self.embedding_store.put_many, repo, dict(zip(missing, vectors)))
+                embedded += len(missing)
+
+        batch = []
+        async with aclosing(self.stream_file_contents(files, degraded, deadline, refresh)) as stream:
+            async for file in stream:
+                batch.append(file)
+                if len(batch) >= CONFIG['EMBED_BATCH_SIZE']:
+                    await flush(batch)
+                    batch = []
+        if batch:
+            await flush(batch)
+        return {'embedded': embedded, 'reused': reused, 'degraded_files': degraded}
 
     def preprocess_content(self, content: str) -> str:
         """
@@ -56,15 +251,23 @@ class IssueMatcher:
         except ZeroDivisionError:
             return 0.0
 
-    async def match_files(self, issue_data: Dict, filtered_files: List[Dict]) -> Dict:
+    async def match_files(self, issue_data: Dict, filtered_files: List[Dict], deadline: Deadline = None) -> Dict:
         """
         Match files to the issue based on similarity scores.
+
+        Files stream through download -> embed -> score and only the running
+        top TOP_K_MATCHES are kept, so memory stays flat in the file count.
+        If the deadline passes first, the ranking over the files processed so
+        far is returned with `partial: True`.
         """
+        deadline = deadline or Deadline(CONFIG['REQUEST_DEADLINE'])
         try:
-            # Check cache first
+            # Check cache first; file order does not change the ranking, and
+            # sorting lets webhook-precomputed results match client requests.
+            # Blob SHAs, when given, keep a result from outliving the content.
             cache_key = self.cache.get_cache_key({
                 'issue': issue_data,
-                'files': [f['path'] for f in filtered_files]
+                'files': sorted((f['path'], f.get('sha') or '') for f in filtered_files)
             })
             
             cached_result = self.cache.get(cache_key)
@@ -74,52 +277,73 @@ class IssueMatcher:
 
             # Process issue text
             issue_text = f"{issue_data['title']} {issue_data.get('description', '')}"
-            issue_embedding = self.embedding_generator.generate_embedding(issue_text)
+            issue_vector = (await self.embedding_generator.encode([issue_text]))[0]
+
+            repo = f"{issue_data['owner']}/{issue_data['repo']}"
+            degraded = []
+
+            # Files listed with a blob SHA that is already embedded are scored
+            # from the store without being downloaded again. Scoring them in
+            # one lookup up front means a concurrent eviction cannot drop a
+            # file: whatever did not score goes through the download stream.
+            stored_scores = await asyncio.to_thread(
+                self.embedding_store.score_many, repo, {f['sha'] for f in filtered_files if f.get('sha')}, issue_vector
+            )
+            stored_files = [f for f in filtered_files if f.get('sha') in stored_scores]
+            file_stream = self.stream_file_contents(
+                [f for f in filtered_files if f.get('sha') not in stored_scores], degraded, deadline
+            )
+
+            # Rank files as their scores arrive, keeping a running top-k
+            top_matches = []  # min-heap of (similarity, seq, match)
+            processed = 0
+            partial = False
 
-            # Fetch file contents
-            file_contents = await self.fetch_all_files(filtered_files)
-            if not file_contents:
+            def rank(file_data, similarity):
+                nonlocal processed
+                processed += 1
+                if similarity <= CONFIG['SIMILARITY_THRESHOLD']:
+                    return
+                entry = (similarity, processed, {
+                    "file_name": file_data['path'],
+                    "match_score": round(similarity, 2),
+                    "download_url": file_data['download_url'],
+                    "content_hash": file_data['content_hash']
+                })
+                if len(top_matches) < CONFIG['TOP_K_MATCHES']:
+                    heapq.heappush(top_matches, entry)
+                else:
+                    heapq.heappushpop(top_matches, entry)
+
+            for f in stored_files:
+                rank({**f, 'content_hash': f['sha']}, stored_scores[f['sha']])
+            try:
+                async with asyncio.timeout_at(deadline.loop_time()):
+                    async with aclosing(self.score_file_stream(file_stream, repo, issue_vector)) as pairs:
+                        async for file_data, similarity in pairs:
+                            rank(file_data, similarity)
+            except TimeoutError:
+                logging.warning(f"Deadline reached after {processed}/{len(filtered_files)} files; returning partial ranking")
+                partial = True
+
+            if not processed and not partial:
                 logging.warning("No valid files to analyze")
-                return {"status": "error", "message": "No valid files to analyze"}
-
-            # Process files in parallel
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                file_embeddings = list(executor.map(
-                    lambda x: {
-                        'path': x['path'],
-                        'embedding': self.embedding_generator.generate_embedding(
-                            self.preprocess_content(x['content'])
-                        ),
-                        'download_url': x['download_url']
-                    },
-                    file_contents
-                ))
-
-            # Calculate similarities
-            matches = []
-            for file_data in file_embeddings:
-                similarity = self.calculate_similarity(
-                    issue_embedding.cpu().numpy(),
-                    file_data['embedding'].cpu().numpy()
-                )
-                if similarity > 0.1:  # Minimum threshold
-                    matches.append({
-                        "file_name": file_data['path'],
-                        "match_score": round(similarity, 2),
-                        "download_url": file_data['download_url']
-                    })
+                return {"status": "error", "message": "No valid files to analyze", "degraded_files": degraded}
 
             # Sort and return results
-            matches.sort(key=lambda x: x['match_score'], reverse=True)
+            matches = [match for _, _, match in sorted(top_matches, key=lambda e: (-e[0], e[1]))]
             result = {
-                "filename_matches": matches[:]
+                "filename_matches": matches,
+                "degraded_files": degraded,
+                "partial": partial,
+                "files_processed": processed
             }
 
-            # Cache the result
-            self.cache.set(cache_key, result)
+            # Cache the result, unless files are missing that a retry could pick up
+            if not degraded and not partial:
+                self.cache.set(cache_key, result)
             return result
 
         except Exception as e:
             logging.exception("Error in match_files")
             return {"status": "error", "message": str(e)}
-
@@ -0,0 +1,123 @@
+# server/model/precompute.py
+import asyncio
+import itertools
+import logging
+import time
+from .config import CONFIG
+
+# Lower runs first: an opened issue is about to be looked at, a push only
+# keeps embeddings fresh
+PRIORITY_ISSUE = 0
+PRIORITY_PUSH = 1
+
+
+class TokenBucket:
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        """
+        Seconds until a token is available (0 if one is available now).
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class PrecomputeJob:
+    def __init__(self, key, repo, priority, run):
+        self.key = key  # jobs with the same key are coalesced while queued
+        self.repo = repo
+        self.priority = priority
+        self.run = run  # async callable doing the work
+        self.enqueued = time.time()
+
+
+class PrecomputeQueue:
+    """
+    Background work triggered by webhooks, run ahead of user requests.
+
+    Jobs are ordered by priority, then arrival. A job whose key is already
+    queued replaces the queued one instead of running twice. A global and a
+    per-repo token bucket keep a burst of events from crowding out user
+    traffic or tripping GitHub's rate limits.
+    """
+
+    def __init__(self):
+        self.queue = None
+        self.pending = {}  # key -> job waiting in the queue
+        self.workers = []
+        self.sequence = itertools.count()
+        self.global_bucket = TokenBucket(CONFIG['PRECOMPUTE_JOBS_PER_MINUTE'], CONFIG['PRECOMPUTE_BURST'])
+        self.repo_buckets = {}
+        self.stats = {'enqueued': 0, 'coalesced': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+
+    def _start(self):
+        if self.queue is None:
+            self.queue = asyncio.PriorityQueue()
+        self.workers = [w for w in self.workers if not w.done()]
+        loop = asyncio.get_running_loop()
+        while len(self.workers) < CONFIG['PRECOMPUTE_WORKERS']:
+            self.workers.append(loop.create_task(self._work()))
+
+    def enqueue(self, job: PrecomputeJob) -> bool:
+        """
+        Queue a job; returns False if the queue is full.
+        """
+        self._start()
+        queued = self.pending.get(job.key)
+        if queued:
+            # The newest event wins; the queued entry keeps its position
+            queued.run = job.run
+            self.stats['coalesced'] += 1
+            return True
+        if len(self.pending) >= CONFIG['PRECOMPUTE_QUEUE_SIZE']:
+            self.stats['rejected'] += 1
+            return False
+        self.pending[job.key] = job
+        self.queue.put_nowait((job.priority, next(self.sequence), job))
+        self.stats['enqueued'] += 1
+        return True
+
+    def status(self):
+        return {**self.stats, 'queued': len(self.pending), 'workers': len([w for w in self.workers if not w.done()])}
+
+    async def _work(self):
+        while True:
+            priority, seq, job = await self.queue.get()
+
+            bucket = self.repo_buckets.setdefault(
+                job.repo, TokenBucket(CONFIG['PRECOMPUTE_REPO_JOBS_PER_MINUTE'], CONFIG['PRECOMPUTE_REPO_BURST'])
+            )
+            wait = self.global_bucket.wait_time()
+            if wait > 0:
+                # Nothing may run yet: keep its place and wait
+                self.queue.put_nowait((priority, seq, job))
+                await asyncio.sleep(min(wait, 1.0))
+                continue
+            wait = bucket.wait_time()
+            if wait > 0:
+                # This repo is over its share: requeue behind its priority
+                # class so other repos' jobs go first
+                self.queue.put_nowait((priority, next(self.sequence), job))
+                await asyncio.sleep(0.05 if self.queue.qsize() > 1 else min(wait, 1.0))
+                continue
+            self.global_bucket.take()
+            bucket.take()
+
+            # From here on a new event for this key queues a fresh run
+            self.pending.pop(job.key, None)
+            try:
+                await job.run()
+                self.stats['completed'] += 1
+                logging.info(f"Precompute job {job.key} done after {time.time() - job.enqueued:.1f}s")
+            except Exception:
+                self.stats['failed'] += 1
+                logging.exception(f"Precompute job {job.key} failed")
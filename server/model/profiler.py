@@ -0,0 +1,232 @@
+# server/model/profiler.py
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from .config import CONFIG
+
+PROFILE_MODES = ('cprofile', 'sample')
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# cProfile and tracemalloc are process-wide, so one request at a time
+_capture_lock = threading.Lock()
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples every thread's stack at a fixed rate and counts them in
+    collapsed-stack form (flamegraph.pl / speedscope input). Unlike cProfile
+    this also sees the executor threads that run embedding.
+    """
+
+    def __init__(self, hz, max_seconds):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.interval = 1.0 / hz
+        self.max_seconds = max_seconds
+        self.stopped = threading.Event()
+        self.counts = Counter()
+
+    def run(self):
+        names = {}
+        end = time.monotonic() + self.max_seconds
+        while not self.stopped.wait(self.interval) and time.monotonic() < end:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return ''.join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class ProfileCapture:
+    """
+    CPU profile (cProfile or sampling) plus a tracemalloc diff around one
+    request. start() returns False if another request is already being
+    profiled in this process, in which case nothing is captured. Nothing is
+    captured past PROFILE_MAX_SECONDS; the caller arranges for expire() to
+    run on the starting thread by then.
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.profile = None
+        self.sampler = None
+        self.started_tracemalloc = False
+        self.memory_before = None
+        self.memory_after = None
+        self.memory_lock = threading.Lock()
+
+    def start(self) -> bool:
+        if not _capture_lock.acquire(blocking=False):
+            return False
+        try:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(CONFIG['PROFILE_TRACEMALLOC_FRAMES'])
+                self.started_tracemalloc = True
+            self.memory_before = tracemalloc.take_snapshot()
+            if self.mode == 'sample':
+                self.sampler = StackSampler(min(CONFIG['PROFILE_SAMPLE_HZ'], 1000), CONFIG['PROFILE_MAX_SECONDS'])
+                self.sampler.start()
+            else:
+                # Covers the event loop thread: coroutines of other requests running
+                # at the same time show up too, executor threads do not
+                self.profile = cProfile.Profile()
+                self.profile.enable()
+        except Exception:
+            # Leave nothing running, or every later capture would report busy
+            if self.started_tracemalloc:
+                tracemalloc.stop()
+            _capture_lock.release()
+            raise
+        return True
+
+    def halt(self):
+        """
+        Stop the CPU profiler. It hooks the thread that started it, so this
+        must run there; stop() can then run on any thread.
+        """
+        if self.profile:
+            self.profile.disable()
+
+    def expire(self):
+        """
+        End the capture at the time cap while the request goes on: stop the
+        CPU profiler, and take the closing heap snapshot and stop tracemalloc
+        on a separate thread, as the snapshot is slow. Runs on the thread
+        that called start().
+        """
+        self.halt()
+        threading.Thread(target=self.snapshot_memory, daemon=True, name="profile-expire").start()
+
+    def snapshot_memory(self):
+        """
+        Take the closing heap snapshot and stop tracemalloc if this capture
+        started it. Only the first call does anything.
+        """
+        with self.memory_lock:
+            if self.memory_after is not None:
+                return
+            self.memory_after = tracemalloc.take_snapshot()
+            if self.started_tracemalloc:
+                tracemalloc.stop()
+                self.started_tracemalloc = False
+
+    def stop(self) -> dict:
+        """
+        Stop capturing and return {artifact name: bytes}.
+        """
+        try:
+            artifacts = {}
+            if self.profile:
+                self.profile.disable()
+                stats = pstats.Stats(self.profile)
+                fd, path = tempfile.mkstemp(suffix='.prof')
+                os.close(fd)
+                try:
+                    stats.dump_stats(path)
+                    with open(path, 'rb') as f:
+                        artifacts['cpu.prof'] = f.read()
+                finally:
+                    os.remove(path)
+                summary = io.StringIO()
+                pstats.Stats(self.profile, stream=summary).sort_stats('cumulative').print_stats(50)
+                artifacts['cpu.txt'] = summary.getvalue().encode()
+            if self.sampler:
+                artifacts['cpu.collapsed'] = self.sampler.stop().encode()
+
+            self.snapshot_memory()
+            top = self.memory_after.compare_to(self.memory_before, 'traceback')[:CONFIG['PROFILE_TRACEMALLOC_TOP']]
+            lines = []
+            for stat in top:
+                lines.append(str(stat))
+                lines.extend(f"    {line}" for line in stat.traceback.format())
+            artifacts['memory.txt'] = '\n'.join(lines).encode()
+            return artifacts
+        finally:
+            with self.memory_lock:
+                if self.started_tracemalloc:
+                    tracemalloc.stop()
+                    self.started_tracemalloc = False
+            _capture_lock.release()
+
+
+class ProfileStore:
+    """
+    Captured profiles on local disk, keeping at most PROFILE_MAX_STORED
+    profiles and PROFILE_MAX_BYTES in total; the oldest go first.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "issuezz-profiles"))
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def save(self, artifacts: dict, meta: str, profile_id=None) -> str:
+        profile_id = profile_id or self.new_id()
+        profile_dir = os.path.join(self.root, profile_id)
+        os.makedirs(profile_dir)
+        artifacts = {**artifacts, 'meta.txt': meta.encode()}
+        for name, data in artifacts.items():
+            with open(os.path.join(profile_dir, name), 'wb') as f:
+                f.write(data)
+        self._evict()
+        return profile_id
+
+    def list(self):
+        profiles = []
+        for profile_id in os.listdir(self.root):
+            profile_dir = os.path.join(self.root, profile_id)
+            if not PROFILE_ID_PATTERN.match(profile_id) or not os.path.isdir(profile_dir):
+                continue
+            names = os.listdir(profile_dir)
+            size = sum(os.path.getsize(os.path.join(profile_dir, n)) for n in names)
+            profiles.append({
+                'id': profile_id,
+                'created': os.path.getmtime(profile_dir),
+                'bytes': size,
+                'artifacts': sorted(names)
+            })
+        return sorted(profiles, key=lambda p: p['created'], reverse=True)
+
+    def path(self, profile_id, name):
+        """
+        Path of one artifact, or None; ids and names are checked so a
+        request cannot reach outside the store.
+        """
+        if not PROFILE_ID_PATTERN.match(profile_id) or '/' in name or name.startswith('.'):
+            return None
+        path = os.path.join(self.root, profile_id, name)
+        return path if os.path.isfile(path) else None
+
+    def _evict(self):
+        profiles = self.list()
+        total = sum(p['bytes'] for p in profiles)
+        while profiles and (len(profiles) > CONFIG['PROFILE_MAX_STORED'] or total > CONFIG['PROFILE_MAX_BYTES']):
+            oldest = profiles.pop()
+            total -= oldest['bytes']
+            profile_dir = os.path.join(self.root, oldest['id'])
+            for name in oldest['artifacts']:
+                os.remove(os.path.join(profile_dir, name))
+            os.rmdir(profile_dir)
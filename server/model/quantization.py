@@ -0,0 +1,127 @@
+# server/model/quantization.py
+import os
+import numpy as np
+from .config import CONFIG
+
+CODEC_KINDS = ('float32', 'float16', 'int8')
+
+# Rows scored per matmul, so the float32 copy of compressed rows stays small
+SCORE_CHUNK_ROWS = 4096
+
+
+def fit_pca(vectors, dims):
+    """
+    Fit a projection to `dims` dimensions from a sample of embeddings.
+
+    Uses the top right singular vectors of the uncentered data (truncated
+    SVD) rather than centered PCA: it keeps the dot products cosine ranking
+    depends on, where centering would shift them. Returns a (dims, d) matrix.
+    Needs at least `dims` vectors: fewer cannot span `dims` dimensions.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) < dims:
+        raise ValueError(f"need at least {dims} embeddings to fit a {dims}-dimension projection, got {len(vectors)}")
+    _, _, vt = np.linalg.svd(vectors, full_matrices=False)
+    return vt[:dims].astype(np.float32)
+
+
+class EmbeddingCodec:
+    """
+    Compact on-disk form for embeddings: float32, float16 or int8 scalar
+    quantization, optionally after a projection to fewer dimensions.
+
+    int8 rows carry a per-vector scale so they can be decoded, but cosine
+    scoring does not need it: the scale cancels out, so scores() works on
+    the int8 codes directly.
+    """
+
+    def __init__(self, kind='float32', dim=None, projection=None):
+        if kind not in CODEC_KINDS:
+            raise ValueError(f"Unknown embedding codec: {kind}")
+        self.kind = kind
+        self.projection = None if projection is None else np.asarray(projection, dtype=np.float32)
+        self.dim = self.projection.shape[0] if self.projection is not None else (dim or CONFIG['EMBEDDING_DIM'])
+
+        if kind == 'int8':
+            self.row_dtype = np.dtype([('scale', '<f4'), ('v', 'i1', (self.dim,))])
+        else:
+            self.row_dtype = np.dtype([('v', '<f2' if kind == 'float16' else '<f4', (self.dim,))])
+
+    @classmethod
+    def from_config(cls):
+        """
+        Codec from CONFIG['EMBEDDING_CODEC'], with the projection saved by
+        embedding_recall.py --fit-pca when EMBEDDING_PCA_PATH points at one.
+        """
+        pca_path = os.getenv("EMBEDDING_PCA_PATH")
+        projection = np.load(pca_path) if pca_path else None
+        return cls(CONFIG['EMBEDDING_CODEC'], projection=projection)
+
+    @property
+    def tag(self):
+        # Stores written with different codecs must not share files
+        return self.kind if self.projection is None else f"{self.kind}-pca{self.dim}"
+
+    def project(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors @ self.projection.T if self.projection is not None else vectors
+
+    def encode(self, vectors):
+        """
+        (n, d) float32 vectors -> structured array of n compressed rows.
+        """
+        vectors = np.atleast_2d(self.project(vectors))
+        rows = np.zeros(len(vectors), dtype=self.row_dtype)
+        if self.kind == 'int8':
+            scale = np.abs(vectors).max(axis=1) / 127
+            scale[scale == 0] = 1.0
+            rows['scale'] = scale
+            rows['v'] = np.clip(np.rint(vectors / scale[:, None]), -127, 127)
+        else:
+            rows['v'] = vectors
+        return rows
+
+    def decode(self, rows):
+        """
+        Compressed rows -> float32 vectors (in the projected space, if any).
+        """
+        vectors = rows['v'].astype(np.float32)
+        if self.kind == 'int8':
+            vectors *= rows['scale'][..., None]
+        return vectors
+
+    def scores(self, query, rows):
+        """
+        Cosine similarity of a float32 query against compressed rows.
+        """
+        q = self.project(query).reshape(-1)
+        q_norm = np.linalg.norm(q)
+        out = np.zeros(len(rows), dtype=np.float32)
+        if q_norm == 0:
+            return out
+        for start in range(0, len(rows), SCORE_CHUNK_ROWS):
+            block = rows['v'][start:start + SCORE_CHUNK_ROWS].astype(np.float32)
+            norms = np.linalg.norm(block, axis=1)
+            dots = block @ q
+            np.divide(dots, norms * q_norm, out=out[start:start + len(block)], where=norms > 0)
+        return out
+
+
+def recall_at_k(queries, vectors, codec, similarity, k=10):
+    """
+    Average fraction of each query's float32 top-k (ranked by `similarity`,
+    i.e. IssueMatcher.calculate_similarity) that the codec's scores also
+    rank in the top k. Also returns the largest absolute score difference.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    rows = codec.encode(vectors)
+    k = min(k, len(vectors))
+    recalls, max_error = [], 0.0
+    for query in queries:
+        exact = np.array([similarity(query, v) for v in vectors], dtype=np.float32)
+        approx = codec.scores(query, rows)
+        top_exact = set(np.argsort(-exact)[:k])
+        top_approx = set(np.argsort(-approx)[:k])
+        recalls.append(len(top_exact & top_approx) / k)
+        max_error = max(max_error, float(np.abs(exact - approx).max()))
+    return float(np.mean(recalls)), max_error
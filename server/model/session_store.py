@@ -0,0 +1,99 @@
+# server/model/session_store.py
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from .config import CONFIG
+
+USE_REDIS = os.getenv("USE_REDIS_CACHE", "false").lower() == "true"
+
+
+class MemorySessionStore:
+    """
+    Chat sessions held in process memory with a TTL that slides on every
+    access. The least recently used session is evicted once MAX_SESSIONS is
+    reached.
+    """
+
+    def __init__(self):
+        self.store = OrderedDict()  # session_id -> (expires_at, pickled session)
+        self.ttl = CONFIG['SESSION_TTL']
+        self.max_sessions = CONFIG['SESSION_MAX_SESSIONS']
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        with self.lock:
+            entry = self.store.get(session_id)
+            if not entry:
+                return None
+            if entry[0] < time.time():
+                del self.store[session_id]
+                return None
+            self.store.move_to_end(session_id)
+            return pickle.loads(entry[1])
+
+    def save(self, session_id, session):
+        with self.lock:
+            self.store[session_id] = (time.time() + self.ttl, pickle.dumps(session))
+            self.store.move_to_end(session_id)
+            while len(self.store) > self.max_sessions:
+                self.store.popitem(last=False)
+
+
+class RedisSessionStore:
+    """
+    Chat sessions in Redis, so any worker can serve any turn. Redis expires
+    idle sessions; memory eviction is left to its maxmemory policy.
+    """
+
+    def __init__(self):
+        import redis
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.client = redis.Redis.from_url(redis_url)
+        self.ttl = CONFIG['SESSION_TTL']
+
+    def get(self, session_id):
+        raw_data = self.client.get(f"session:{session_id}")
+        if not raw_data:
+            return None
+        self.client.expire(f"session:{session_id}", self.ttl)
+        return pickle.loads(raw_data)
+
+    def save(self, session_id, session):
+        self.client.setex(f"session:{session_id}", self.ttl, pickle.dumps(session))
+
+
+class SessionStore:
+    """
+    Server-side chat state: turns, references to files in the content store
+    and anything derived from them (prompt prefixes) so clients only send the
+    new query.
+    """
+
+    def __init__(self):
+        self.backend = RedisSessionStore() if USE_REDIS else MemorySessionStore()
+        self.max_turns = CONFIG['SESSION_MAX_TURNS']
+
+    def create(self, **data) -> str:
+        session_id = uuid.uuid4().hex
+        self.backend.save(session_id, {'turns': [], 'derived': {}, **data})
+        return session_id
+
+    def get(self, session_id):
+        return self.backend.get(session_id) if session_id else None
+
+    def save(self, session_id, session):
+        self.backend.save(session_id, session)
+
+    def append_turns(self, session_id, session, *turns):
+        """
+        Record new turns ({'type': 'user'|'bot', 'content': ...}), keeping only
+        the most recent SESSION_MAX_TURNS.
+        """
+        session['turns'] = (session['turns'] + list(turns))[-self.max_turns:]
+        self.save(session_id, session)
+
+
+session_store = SessionStore()